@@ -4,26 +4,71 @@ Data Analysis Endpoints
 
 from typing import Optional, List
 from fastapi import APIRouter, HTTPException, BackgroundTasks
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel
 from loguru import logger
+from concurrent.futures import ProcessPoolExecutor
+import asyncio
+import multiprocessing
+import os
 import uuid
-from datetime import datetime
 
 from app.config import settings
+from app.core.logging_config import configure_logging
+from app.core.state import state
+from app.core.timestamps import utc_now_iso
 from app.services.file_parser import FileParser
 from app.services.data_profiler import DataProfiler
 from app.services.chart_recommender import ChartRecommender
 from app.services.insight_generator import InsightGenerator
+from app.services.ai_service import close_http_client
 
-# Import uploads database (shared state)
-from app.api.v1.upload import uploads_db
+from app.api.v1.upload import UPLOADS_NS
 
-router = APIRouter()
+router = APIRouter(default_response_class=ORJSONResponse)
+
+# Endpoints returning stored results build the ORJSONResponse themselves:
+# a returned dict would first be copied element by element through FastAPI's
+# jsonable_encoder, which costs far more than the orjson encoding of chart data
 
 # ===========================================
-# In-memory storage (replace with database)
+# Storage
 # ===========================================
-analyses_db: dict = {}
+# Analysis records live in the shared state store under this namespace
+ANALYSES_NS = "analysis"
+
+# Latest completed analysis id per dataset (used for chat context)
+LATEST_ANALYSIS_NS = "dataset_analysis"
+
+# Analyses run in a process pool so concurrent requests aren't serialized on
+# the GIL. Created on first use; "spawn" avoids forking a threaded server.
+_analysis_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_analysis_pool() -> ProcessPoolExecutor:
+    """
+    Get the analysis process pool, creating it on first use
+    """
+    global _analysis_pool
+    if _analysis_pool is None:
+        _analysis_pool = ProcessPoolExecutor(
+            max_workers=settings.ANALYSIS_PROCESSES or os.cpu_count(),
+            mp_context=multiprocessing.get_context("spawn"),
+            # Spawned workers don't import app.main; give them the same sinks
+            initializer=configure_logging,
+            initargs=(False,),
+        )
+    return _analysis_pool
+
+
+def shutdown_analysis_pool() -> None:
+    """
+    Stop the analysis worker processes
+    """
+    global _analysis_pool
+    if _analysis_pool is not None:
+        _analysis_pool.shutdown(wait=False, cancel_futures=True)
+        _analysis_pool = None
 
 
 # ===========================================
@@ -75,56 +120,92 @@ class KPIMetric(BaseModel):
 # Background Analysis Task
 # ===========================================
 
-async def run_analysis(analysis_id: str, dataset_id: str):
+def compute_analysis(file_path: str) -> dict:
     """
-    Run analysis in background
+    Profile a dataset and build its charts, insights and KPIs
+
+    Runs inside an analysis worker process, so it takes and returns only
+    picklable values.
     """
-    try:
-        # Get dataset
-        dataset = uploads_db.get(dataset_id)
-        if not dataset:
-            analyses_db[analysis_id]["status"] = "failed"
-            analyses_db[analysis_id]["error"] = "Dataset not found"
-            return
-        
-        # Update status
-        analyses_db[analysis_id]["status"] = "processing"
-        
+    
+    async def analyze():
         # Parse file
         parser = FileParser()
-        df = parser.parse(dataset["file_path"])
+        df = parser.load(file_path)
         
         # Profile data
         profiler = DataProfiler()
         profile = profiler.profile(df)
         
-        # Generate chart recommendations
+        # Generate insights (may wait on the AI provider) while charts and
+        # KPIs are built in a worker thread
         recommender = ChartRecommender()
-        charts = recommender.recommend(df, profile)
-        
-        # Generate insights
         generator = InsightGenerator()
-        insights = await generator.generate(df, profile)
         
-        # Generate KPIs
-        kpis = profiler.generate_kpis(df)
+        def build_charts_and_kpis():
+            return recommender.recommend(df, profile), profiler.generate_kpis(df)
+        
+        try:
+            insights, (charts, kpis) = await asyncio.gather(
+                generator.generate(df, profile),
+                asyncio.to_thread(build_charts_and_kpis),
+            )
+        finally:
+            # The AI connection pool is bound to this job's event loop
+            await close_http_client()
+        
+        return {"charts": charts, "insights": insights, "kpis": kpis}
+    
+    return asyncio.run(analyze())
+
+
+async def run_analysis(analysis_id: str, dataset_id: str):
+    """
+    Run analysis in background
+    """
+    analysis = await state.get(ANALYSES_NS, analysis_id)
+    if analysis is None:
+        return
+    
+    try:
+        # Get dataset
+        dataset = await state.get(UPLOADS_NS, dataset_id)
+        if not dataset:
+            analysis["status"] = "failed"
+            analysis["error"] = "Dataset not found"
+            await state.set(ANALYSES_NS, analysis_id, analysis)
+            return
+        
+        # Update status
+        analysis["status"] = "processing"
+        await state.set(ANALYSES_NS, analysis_id, analysis)
+        
+        # Heavy lifting happens in a worker process
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(
+            get_analysis_pool(), compute_analysis, dataset["file_path"]
+        )
+        charts, insights = result["charts"], result["insights"]
         
         # Update analysis
-        analyses_db[analysis_id].update({
+        analysis.update({
             "status": "completed",
             "charts": charts,
             "insights": insights,
-            "kpis": kpis,
+            "kpis": result["kpis"],
             "summary": f"Analysis complete. Found {len(insights)} insights and generated {len(charts)} visualizations.",
-            "completed_at": datetime.utcnow().isoformat(),
+            "completed_at": utc_now_iso(),
         })
+        await state.set(ANALYSES_NS, analysis_id, analysis)
+        await state.set(LATEST_ANALYSIS_NS, dataset_id, {"analysis_id": analysis_id})
         
         logger.info(f"Analysis completed: {analysis_id}")
         
     except Exception as e:
         logger.exception(f"Analysis failed: {e}")
-        analyses_db[analysis_id]["status"] = "failed"
-        analyses_db[analysis_id]["error"] = str(e)
+        analysis["status"] = "failed"
+        analysis["error"] = str(e)
+        await state.set(ANALYSES_NS, analysis_id, analysis)
 
 
 # ===========================================
@@ -145,7 +226,7 @@ async def start_analysis(
     """
     
     # Check dataset exists
-    if dataset_id not in uploads_db:
+    if await state.get(UPLOADS_NS, dataset_id) is None:
         raise HTTPException(status_code=404, detail="Dataset not found")
     
     # Create analysis record
@@ -158,10 +239,10 @@ async def start_analysis(
         "insights": [],
         "kpis": [],
         "summary": None,
-        "created_at": datetime.utcnow().isoformat(),
+        "created_at": utc_now_iso(),
     }
     
-    analyses_db[analysis_id] = analysis
+    await state.set(ANALYSES_NS, analysis_id, analysis)
     
     # Start background analysis
     background_tasks.add_task(run_analysis, analysis_id, dataset_id)
@@ -183,15 +264,14 @@ async def get_analysis(analysis_id: str):
     Get analysis results
     """
     
-    if analysis_id not in analyses_db:
+    analysis = await state.get(ANALYSES_NS, analysis_id)
+    if analysis is None:
         raise HTTPException(status_code=404, detail="Analysis not found")
     
-    analysis = analyses_db[analysis_id]
-    
-    return {
+    return ORJSONResponse({
         "success": True,
         "data": analysis,
-    }
+    })
 
 
 @router.get("/{analysis_id}/charts")
@@ -200,21 +280,20 @@ async def get_charts(analysis_id: str):
     Get chart configurations for an analysis
     """
     
-    if analysis_id not in analyses_db:
+    analysis = await state.get(ANALYSES_NS, analysis_id)
+    if analysis is None:
         raise HTTPException(status_code=404, detail="Analysis not found")
     
-    analysis = analyses_db[analysis_id]
-    
     if analysis["status"] != "completed":
         raise HTTPException(
             status_code=400,
             detail=f"Analysis not complete. Status: {analysis['status']}",
         )
     
-    return {
+    return ORJSONResponse({
         "success": True,
         "data": analysis["charts"],
-    }
+    })
 
 
 @router.get("/{analysis_id}/insights")
@@ -223,21 +302,20 @@ async def get_insights(analysis_id: str):
     Get AI-generated insights for an analysis
     """
     
-    if analysis_id not in analyses_db:
+    analysis = await state.get(ANALYSES_NS, analysis_id)
+    if analysis is None:
         raise HTTPException(status_code=404, detail="Analysis not found")
     
-    analysis = analyses_db[analysis_id]
-    
     if analysis["status"] != "completed":
         raise HTTPException(
             status_code=400,
             detail=f"Analysis not complete. Status: {analysis['status']}",
         )
     
-    return {
+    return ORJSONResponse({
         "success": True,
         "data": analysis["insights"],
-    }
+    })
 
 
 @router.get("/{analysis_id}/kpis")
@@ -246,21 +324,20 @@ async def get_kpis(analysis_id: str):
     Get KPI metrics for an analysis
     """
     
-    if analysis_id not in analyses_db:
+    analysis = await state.get(ANALYSES_NS, analysis_id)
+    if analysis is None:
         raise HTTPException(status_code=404, detail="Analysis not found")
     
-    analysis = analyses_db[analysis_id]
-    
     if analysis["status"] != "completed":
         raise HTTPException(
             status_code=400,
             detail=f"Analysis not complete. Status: {analysis['status']}",
         )
     
-    return {
+    return ORJSONResponse({
         "success": True,
         "data": analysis.get("kpis", []),
-    }
+    })
 
 
 @router.delete("/{analysis_id}")
@@ -269,11 +346,9 @@ async def delete_analysis(analysis_id: str):
     Delete an analysis
     """
     
-    if analysis_id not in analyses_db:
+    if not await state.delete(ANALYSES_NS, analysis_id):
         raise HTTPException(status_code=404, detail="Analysis not found")
     
-    del analyses_db[analysis_id]
-    
     return {
         "success": True,
         "message": "Analysis deleted successfully",
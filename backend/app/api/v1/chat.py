@@ -4,25 +4,35 @@ AI Chat Endpoints
 
 from typing import Optional, List
 from fastapi import APIRouter, HTTPException
-from fastapi.responses import StreamingResponse
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from pydantic import BaseModel
 from loguru import logger
 import uuid
-from datetime import datetime
-import json
+import orjson
 import asyncio
 
 from app.config import settings
+from app.core.state import state
+from app.core.timestamps import utc_now_iso
 from app.services.ai_service import AIService
-from app.api.v1.upload import uploads_db
-from app.api.v1.analysis import analyses_db
+from app.api.v1.upload import UPLOADS_NS
+from app.api.v1.analysis import ANALYSES_NS, LATEST_ANALYSIS_NS
 
-router = APIRouter()
+router = APIRouter(default_response_class=ORJSONResponse)
 
 # ===========================================
-# In-memory storage (replace with database)
+# Storage
 # ===========================================
-chat_sessions_db: dict = {}
+# Chat sessions live in the shared state store under this namespace
+SESSIONS_NS = "chat_session"
+
+# Static parts of a streamed `data: {"chunk": ...}` event; only the chunk
+# text itself is JSON-encoded per token
+SSE_CHUNK_PREFIX = b'data: {"chunk":'
+SSE_CHUNK_SUFFIX = b'}\n\n'
+
+# Keep proxies (nginx) and browsers from buffering or caching the stream
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
 
 
 # ===========================================
@@ -59,37 +69,45 @@ class SessionResponse(BaseModel):
 # Helper Functions
 # ===========================================
 
-def get_data_context(dataset_id: Optional[str]) -> str:
+async def get_data_context(dataset_id: Optional[str]) -> str:
     """
     Get context about the dataset for the AI
     """
-    if not dataset_id or dataset_id not in uploads_db:
+    dataset = await state.get(UPLOADS_NS, dataset_id) if dataset_id else None
+    if dataset is None:
         return "No dataset is currently loaded."
     
-    dataset = uploads_db[dataset_id]
-    
     # Build context string
-    context = f"""
-Dataset Information:
-- Name: {dataset['name']}
-- Rows: {dataset['row_count']:,}
-- Columns: {dataset['column_count']}
-
-Columns:
-"""
+    parts = [
+        f"\nDataset Information:\n"
+        f"- Name: {dataset['name']}\n"
+        f"- Rows: {dataset['row_count']:,}\n"
+        f"- Columns: {dataset['column_count']}\n"
+        "\nColumns:\n"
+    ]
     
     for col in dataset['columns'][:20]:  # Limit to 20 columns
-        context += f"- {col['name']} ({col['type']}): {col['unique']} unique values, {col['missing']} missing\n"
+        parts.append(f"- {col['name']} ({col['type']}): {col['unique']} unique values, {col['missing']} missing\n")
     
     # Add analysis insights if available
-    for analysis in analyses_db.values():
-        if analysis.get('dataset_id') == dataset_id and analysis.get('status') == 'completed':
-            context += "\nAnalysis Insights:\n"
-            for insight in analysis.get('insights', [])[:5]:
-                context += f"- {insight['title']}: {insight['description']}\n"
-            break
+    latest = await state.get(LATEST_ANALYSIS_NS, dataset_id)
+    analysis = await state.get(ANALYSES_NS, latest["analysis_id"]) if latest else None
+    if analysis and analysis.get('status') == 'completed':
+        parts.append("\nAnalysis Insights:\n")
+        for insight in analysis.get('insights', [])[:5]:
+            parts.append(f"- {insight['title']}: {insight['description']}\n")
     
-    return context
+    return "".join(parts)
+
+
+def append_message(session: dict, message: ChatMessage) -> None:
+    """
+    Append a message to a session, dropping the oldest beyond CHAT_MAX_HISTORY
+    """
+    messages = session["messages"]
+    messages.append(message.model_dump())
+    if len(messages) > settings.CHAT_MAX_HISTORY:
+        del messages[:-settings.CHAT_MAX_HISTORY]
 
 
 def create_system_prompt(data_context: str) -> str:
@@ -131,32 +149,32 @@ async def chat(request: ChatRequest):
     
     try:
         # Get or create session
+        now = utc_now_iso()
         session_id = request.session_id
+        session = await state.get(SESSIONS_NS, session_id) if session_id else None
         
-        if session_id and session_id in chat_sessions_db:
-            session = chat_sessions_db[session_id]
-        else:
+        if session is None:
             # Create new session
             session_id = str(uuid.uuid4())
             session = {
                 "id": session_id,
                 "dataset_id": request.dataset_id,
                 "messages": [],
-                "created_at": datetime.utcnow().isoformat(),
-                "updated_at": datetime.utcnow().isoformat(),
+                "created_at": now,
+                "updated_at": now,
             }
-            chat_sessions_db[session_id] = session
         
         # Add user message
         user_message = ChatMessage(
             role="user",
             content=request.message,
-            timestamp=datetime.utcnow().isoformat(),
+            timestamp=now,
         )
-        session["messages"].append(user_message.model_dump())
+        append_message(session, user_message)
+        await state.set(SESSIONS_NS, session_id, session)
         
         # Get data context
-        data_context = get_data_context(request.dataset_id or session.get("dataset_id"))
+        data_context = await get_data_context(request.dataset_id or session.get("dataset_id"))
         system_prompt = create_system_prompt(data_context)
         
         # Prepare messages for AI
@@ -177,38 +195,41 @@ async def chat(request: ChatRequest):
         if request.stream:
             # Streaming response
             async def generate():
-                full_response = ""
+                parts = []
                 async for chunk in ai_service.chat_stream(ai_messages):
-                    full_response += chunk
-                    yield f"data: {json.dumps({'chunk': chunk})}\n\n"
+                    parts.append(chunk)
+                    yield SSE_CHUNK_PREFIX + orjson.dumps(chunk) + SSE_CHUNK_SUFFIX
                 
                 # Save assistant message
                 assistant_message = ChatMessage(
                     role="assistant",
-                    content=full_response,
-                    timestamp=datetime.utcnow().isoformat(),
+                    content="".join(parts),
+                    timestamp=utc_now_iso(),
                 )
-                session["messages"].append(assistant_message.model_dump())
-                session["updated_at"] = datetime.utcnow().isoformat()
+                append_message(session, assistant_message)
+                session["updated_at"] = assistant_message.timestamp
+                await state.set(SESSIONS_NS, session_id, session)
                 
-                yield f"data: {json.dumps({'done': True, 'session_id': session_id})}\n\n"
+                yield b"data: " + orjson.dumps({"done": True, "session_id": session_id}) + b"\n\n"
             
             return StreamingResponse(
                 generate(),
                 media_type="text/event-stream",
+                headers=SSE_HEADERS,
             )
         else:
             # Regular response
-            response = await ai_service.chat(ai_messages)
+            response = await ai_service.chat(ai_messages, bypass_cache=True)
             
             # Save assistant message
             assistant_message = ChatMessage(
                 role="assistant",
                 content=response,
-                timestamp=datetime.utcnow().isoformat(),
+                timestamp=utc_now_iso(),
             )
-            session["messages"].append(assistant_message.model_dump())
-            session["updated_at"] = datetime.utcnow().isoformat()
+            append_message(session, assistant_message)
+            session["updated_at"] = assistant_message.timestamp
+            await state.set(SESSIONS_NS, session_id, session)
             
             return {
                 "success": True,
@@ -230,7 +251,7 @@ async def list_sessions(limit: int = 10):
     """
     
     sessions = sorted(
-        chat_sessions_db.values(),
+        await state.values(SESSIONS_NS),
         key=lambda x: x["updated_at"],
         reverse=True,
     )[:limit]
@@ -247,12 +268,13 @@ async def get_session(session_id: str):
     Get a specific chat session
     """
     
-    if session_id not in chat_sessions_db:
+    session = await state.get(SESSIONS_NS, session_id)
+    if session is None:
         raise HTTPException(status_code=404, detail="Session not found")
     
     return {
         "success": True,
-        "data": chat_sessions_db[session_id],
+        "data": session,
     }
 
 
@@ -262,11 +284,9 @@ async def delete_session(session_id: str):
     Delete a chat session
     """
     
-    if session_id not in chat_sessions_db:
+    if not await state.delete(SESSIONS_NS, session_id):
         raise HTTPException(status_code=404, detail="Session not found")
     
-    del chat_sessions_db[session_id]
-    
     return {
         "success": True,
         "message": "Session deleted successfully",
@@ -279,11 +299,13 @@ async def clear_session(session_id: str):
     Clear messages in a session but keep the session
     """
     
-    if session_id not in chat_sessions_db:
+    session = await state.get(SESSIONS_NS, session_id)
+    if session is None:
         raise HTTPException(status_code=404, detail="Session not found")
     
-    chat_sessions_db[session_id]["messages"] = []
-    chat_sessions_db[session_id]["updated_at"] = datetime.utcnow().isoformat()
+    session["messages"] = []
+    session["updated_at"] = utc_now_iso()
+    await state.set(SESSIONS_NS, session_id, session)
     
     return {
         "success": True,
@@ -4,13 +4,14 @@ Combines all API endpoints
 """
 
 from fastapi import APIRouter
+from fastapi.responses import ORJSONResponse
 
 from app.api.v1 import upload, analysis, chat
 
 # ===========================================
 # Create Main Router
 # ===========================================
-api_router = APIRouter()
+api_router = APIRouter(default_response_class=ORJSONResponse)
 
 # ===========================================
 # Include Sub-Routers
@@ -2,26 +2,33 @@
 File Upload Endpoints
 """
 
-from typing import Optional
+from typing import Optional, Tuple
 from fastapi import APIRouter, UploadFile, File, HTTPException, BackgroundTasks
-from fastapi.responses import JSONResponse
-from pydantic import BaseModel
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, ORJSONResponse
+from pydantic import BaseModel, ConfigDict, TypeAdapter
 from loguru import logger
+import aiofiles
 import os
 import uuid
-from datetime import datetime
 
 from app.config import settings
-from app.core.exceptions import InvalidFileError, FileTooLargeError
+from app.core.exceptions import InvalidFileError, FileTooLargeError, UploadFailedError
+from app.core.state import state
+from app.core.timestamps import utc_now_iso
 from app.services.file_parser import FileParser
 from app.services.data_profiler import DataProfiler
 
-router = APIRouter()
+router = APIRouter(default_response_class=ORJSONResponse)
 
 # ===========================================
-# In-memory storage (replace with database)
+# Storage
 # ===========================================
-uploads_db: dict = {}
+# Dataset records live in the shared state store under this namespace
+UPLOADS_NS = "upload"
+
+# Bytes read from the request body per iteration when saving uploads
+UPLOAD_CHUNK_SIZE = 1024 * 1024
 
 
 # ===========================================
@@ -38,6 +45,10 @@ class ColumnInfo(BaseModel):
 
 
 class DatasetResponse(BaseModel):
+    # Dataset records carry server-side keys (file_path, "public", per-column
+    # stats) that are dropped here rather than filtered out beforehand
+    model_config = ConfigDict(extra="ignore")
+
     id: str
     name: str
     filename: str
@@ -45,7 +56,8 @@ class DatasetResponse(BaseModel):
     row_count: int
     column_count: int
     columns: list[ColumnInfo]
-    status: str
+    status: str  # "processing", "ready" or "failed"
+    error: Optional[str] = None
     created_at: str
     
 
@@ -55,10 +67,24 @@ class UploadResponse(BaseModel):
     message: str
 
 
+# Built once; validates and dumps records without going through __init__
+DATASET_ADAPTER = TypeAdapter(DatasetResponse)
+
+
 # ===========================================
 # Helper Functions
 # ===========================================
 
+def public_view(dataset: dict) -> dict:
+    """
+    Client-facing part of a dataset record
+
+    Built whenever the record changes and stored with it under "public", so
+    reads return it as-is. Drops file_path and per-column stats.
+    """
+    return DATASET_ADAPTER.dump_python(DATASET_ADAPTER.validate_python(dataset))
+
+
 def validate_file(file: UploadFile) -> None:
     """Validate uploaded file"""
     
@@ -86,8 +112,17 @@ def validate_file(file: UploadFile) -> None:
         logger.warning(f"Unexpected content type: {file.content_type}")
 
 
-async def save_upload_file(file: UploadFile, file_id: str) -> str:
-    """Save uploaded file to disk"""
+async def save_upload_file(file: UploadFile, file_id: str) -> Tuple[str, int]:
+    """Stream uploaded file to disk in fixed-size chunks, returning (path, size)"""
+    
+    # The multipart parser already knows the size of the spooled upload;
+    # reject oversized files before copying a single byte
+    if file.size is not None and file.size > settings.MAX_FILE_SIZE:
+        raise FileTooLargeError(
+            max_size=settings.MAX_FILE_SIZE,
+            actual_size=file.size,
+            filename=file.filename,
+        )
     
     # Create uploads directory if not exists
     os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
@@ -96,22 +131,71 @@ async def save_upload_file(file: UploadFile, file_id: str) -> str:
     ext = os.path.splitext(file.filename)[1]
     file_path = os.path.join(settings.UPLOAD_DIR, f"{file_id}{ext}")
     
-    # Read and save file
-    contents = await file.read()
+    # Copy chunk by chunk, stopping as soon as the size limit is crossed
+    size = 0
+    async with aiofiles.open(file_path, "wb", buffering=UPLOAD_CHUNK_SIZE) as out:
+        while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+            size += len(chunk)
+            if size > settings.MAX_FILE_SIZE:
+                break
+            await out.write(chunk)
     
     # Check file size
-    if len(contents) > settings.MAX_FILE_SIZE:
+    if size > settings.MAX_FILE_SIZE:
+        os.unlink(file_path)
         raise FileTooLargeError(
             max_size=settings.MAX_FILE_SIZE,
-            actual_size=len(contents),
+            actual_size=size,
             filename=file.filename,
         )
     
-    # Write to disk
-    with open(file_path, "wb") as f:
-        f.write(contents)
+    return file_path, size
+
+
+# ===========================================
+# Background Profiling Task
+# ===========================================
+
+async def parse_and_profile(file_id: str, file_path: str):
+    """
+    Parse and profile an uploaded file in background
+    """
+    dataset = await state.get(UPLOADS_NS, file_id)
+    if dataset is None:
+        return
     
-    return file_path
+    try:
+        # Parse file (also snapshots it and warms the DataFrame cache that
+        # preview and analysis read from)
+        parser = FileParser()
+        df = await run_in_threadpool(parser.load, file_path)
+        await run_in_threadpool(
+            parser.write_preview, file_path, df, settings.MAX_ROWS_PREVIEW
+        )
+        
+        # Profile data
+        profiler = DataProfiler()
+        profile = await run_in_threadpool(profiler.profile, df)
+        
+        dataset.update({
+            "row_count": len(df),
+            "column_count": len(df.columns),
+            "columns": profile["columns"],
+            "status": "ready",
+        })
+        dataset["public"] = public_view(dataset)
+        
+        logger.info(f"Upload profiled: {file_id}")
+        
+    except Exception as e:
+        logger.exception(f"Upload profiling failed: {e}")
+        dataset["status"] = "failed"
+        dataset["error"] = str(e)
+        dataset["public"] = public_view(dataset)
+    
+    # Don't resurrect an upload deleted while it was being profiled
+    if await state.get(UPLOADS_NS, file_id) is not None:
+        await state.set(UPLOADS_NS, file_id, dataset)
 
 
 # ===========================================
@@ -127,9 +211,9 @@ async def upload_file(
     Upload a CSV or Excel file for analysis
     
     - Validates file type and size
-    - Parses file contents
-    - Profiles data structure
-    - Returns dataset metadata
+    - Returns dataset metadata with status "processing"
+    - Parses and profiles contents in the background; poll GET /upload/{id}
+      until status is "ready"
     """
     
     try:
@@ -139,42 +223,36 @@ async def upload_file(
         # Generate unique ID
         file_id = str(uuid.uuid4())
         
-        # Save file
-        file_path = await save_upload_file(file, file_id)
-        
-        # Get file size
-        file_size = os.path.getsize(file_path)
-        
-        # Parse file
-        parser = FileParser()
-        df = parser.parse(file_path)
-        
-        # Profile data
-        profiler = DataProfiler()
-        profile = profiler.profile(df)
+        # Save file (size is counted while streaming)
+        file_path, file_size = await save_upload_file(file, file_id)
         
-        # Create dataset record
+        # Create dataset record; columns and counts are filled in once
+        # profiling finishes
         dataset = {
             "id": file_id,
             "name": os.path.splitext(file.filename)[0],
             "filename": file.filename,
             "size": file_size,
-            "row_count": len(df),
-            "column_count": len(df.columns),
-            "columns": profile["columns"],
-            "status": "ready",
+            "row_count": 0,
+            "column_count": 0,
+            "columns": [],
+            "status": "processing",
             "file_path": file_path,
-            "created_at": datetime.utcnow().isoformat(),
+            "created_at": utc_now_iso(),
         }
+        dataset["public"] = public_view(dataset)
+        
+        # Store in shared state
+        await state.set(UPLOADS_NS, file_id, dataset)
         
-        # Store in memory (replace with database)
-        uploads_db[file_id] = dataset
+        # Parse and profile after the response is sent
+        background_tasks.add_task(parse_and_profile, file_id, file_path)
         
         logger.info(f"File uploaded successfully: {file.filename} ({file_id})")
         
         return UploadResponse(
             success=True,
-            data=DatasetResponse(**{k: v for k, v in dataset.items() if k != "file_path"}),
+            data=dataset["public"],
             message=f"Successfully uploaded {file.filename}",
         )
         
@@ -191,14 +269,13 @@ async def get_upload(upload_id: str):
     Get upload status and metadata
     """
     
-    if upload_id not in uploads_db:
+    dataset = await state.get(UPLOADS_NS, upload_id)
+    if dataset is None:
         raise HTTPException(status_code=404, detail="Upload not found")
     
-    dataset = uploads_db[upload_id]
-    
     return {
         "success": True,
-        "data": DatasetResponse(**{k: v for k, v in dataset.items() if k != "file_path"}),
+        "data": dataset["public"],
     }
 
 
@@ -208,20 +285,22 @@ async def delete_upload(upload_id: str):
     Delete an uploaded file
     """
     
-    if upload_id not in uploads_db:
+    dataset = await state.get(UPLOADS_NS, upload_id)
+    if dataset is None:
         raise HTTPException(status_code=404, detail="Upload not found")
     
-    dataset = uploads_db[upload_id]
-    
-    # Delete file from disk
-    try:
-        if os.path.exists(dataset["file_path"]):
-            os.remove(dataset["file_path"])
-    except Exception as e:
-        logger.warning(f"Failed to delete file: {e}")
+    # Delete file and its Parquet sidecars from disk
+    file_path = dataset["file_path"]
+    for path in [file_path, *FileParser.sidecar_paths(file_path)]:
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Failed to delete file: {e}")
     
     # Remove from database
-    del uploads_db[upload_id]
+    await state.delete(UPLOADS_NS, upload_id)
     
     return {
         "success": True,
@@ -235,14 +314,26 @@ async def preview_upload(upload_id: str, rows: int = 10):
     Get a preview of the uploaded data
     """
     
-    if upload_id not in uploads_db:
+    dataset = await state.get(UPLOADS_NS, upload_id)
+    if dataset is None:
         raise HTTPException(status_code=404, detail="Upload not found")
     
-    dataset = uploads_db[upload_id]
+    if dataset["status"] == "failed":
+        raise UploadFailedError(
+            detail=f"Upload failed: {dataset.get('error') or 'unknown error'}",
+            upload_id=upload_id,
+        )
     
-    # Parse file and get preview
+    # Once profiled, serve from the head-rows sidecar; fall back to the
+    # full (cached) DataFrame otherwise
     parser = FileParser()
-    df = parser.parse(dataset["file_path"])
+    ready = dataset["status"] == "ready"
+    df = await run_in_threadpool(parser.read_preview, dataset["file_path"]) if ready else None
+    if df is None:
+        df = await run_in_threadpool(parser.load, dataset["file_path"])
+    
+    # Row count is recorded by profiling; only count rows while it's running
+    total_rows = dataset["row_count"] if ready else len(df)
     
     # Limit rows
     preview_df = df.head(min(rows, settings.MAX_ROWS_PREVIEW))
@@ -250,9 +341,9 @@ async def preview_upload(upload_id: str, rows: int = 10):
     return {
         "success": True,
         "data": {
-            "columns": list(preview_df.columns),
+            "columns": preview_df.columns.tolist(),
             "rows": preview_df.to_dict(orient="records"),
-            "total_rows": len(df),
+            "total_rows": total_rows,
             "preview_rows": len(preview_df),
         },
     }
\ No newline at end of file
@@ -72,6 +72,11 @@ class Settings(BaseSettings):
     REDIS_URL: str = "redis://localhost:6379/0"
     CACHE_TTL: int = 3600  # 1 hour
     
+    # ----- State Store -----
+    # "redis" shares uploads/analyses/sessions across workers; "memory" is per-process
+    STATE_BACKEND: str = Field(default="memory", pattern="^(memory|redis)$")
+    STATE_TTL: int = 86400  # 24 hours
+    
     # ----- AI Services -----
     OPENAI_API_KEY: Optional[str] = None
     OPENAI_MODEL: str = "gpt-4-turbo-preview"
@@ -84,6 +89,18 @@ class Settings(BaseSettings):
     # Default AI provider: "openai" or "anthropic"
     AI_PROVIDER: str = "openai"
     
+    # Prompt + reply token limit; older chat turns are dropped to stay under it
+    AI_CONTEXT_TOKENS: int = 128000
+    
+    # Identical non-streaming prompts are answered from memory for this long
+    AI_CACHE_SIZE: int = 1024
+    AI_CACHE_TTL: int = 3600  # 1 hour
+    
+    # Provider requests in flight at once per batch call
+    AI_MAX_CONCURRENCY: int = 10
+    # Larger opt-in batches go through the OpenAI Batch API instead
+    AI_BATCH_THRESHOLD: int = 20
+    
     # ----- File Upload -----
     MAX_FILE_SIZE: int = 50 * 1024 * 1024  # 50 MB
     ALLOWED_EXTENSIONS: List[str] = [".csv", ".xlsx", ".xls"]
@@ -113,6 +130,11 @@ class Settings(BaseSettings):
     MAX_ROWS_PREVIEW: int = 1000
     MAX_COLUMNS: int = 100
     SAMPLE_SIZE: int = 5
+    DATAFRAME_CACHE_BYTES: int = 512 * 1024 * 1024  # 512 MB of parsed frames per worker
+    CHAT_MAX_HISTORY: int = 200  # messages kept per chat session
+    ANALYSIS_PROCESSES: int = 0  # background analysis processes per worker, 0 = CPU count
+    DEEP_MEMORY_PROFILING: bool = False  # measure every text value instead of sampling
+    PROFILE_PRECISION: str = Field(default="float64", pattern="^(float32|float64)$")  # correlation matrix dtype
     
     # ----- Feature Flags -----
     ENABLE_CHAT: bool = True
@@ -171,9 +193,11 @@ class ProductionSettings(Settings):
         return v
 
 
+@lru_cache()
 def get_settings_by_environment() -> Settings:
-    """Get settings based on environment"""
-    env = Settings().ENVIRONMENT
+    """Get cached settings based on environment"""
+    # Reuse the already-loaded base settings (env vars + .env) to pick the class
+    env = settings.ENVIRONMENT
     if env == "production":
         return ProductionSettings()
     return DevelopmentSettings()
\ No newline at end of file
@@ -2,15 +2,25 @@
 Custom Exception Classes
 """
 
-from typing import Any, Dict, Optional
+from types import MappingProxyType
+from typing import Any, Dict, Mapping, Optional
+
+
+# Shared read-only stand-in for "no details", so raising doesn't allocate one
+_NO_DETAILS: Mapping[str, Any] = MappingProxyType({})
 
 
 class APIException(Exception):
     """
     Base API Exception
     All custom exceptions should inherit from this
+    
+    Attributes live in slots (subclasses declare empty __slots__) rather
+    than the instance __dict__, which BaseException subclasses still have.
     """
     
+    __slots__ = ("status_code", "code", "detail", "details")
+    
     def __init__(
         self,
         status_code: int = 500,
@@ -21,7 +31,7 @@ class APIException(Exception):
         self.status_code = status_code
         self.code = code
         self.detail = detail
-        self.details = details or {}
+        self.details = details if details else _NO_DETAILS
         super().__init__(self.detail)
 
 
@@ -32,6 +42,8 @@ class APIException(Exception):
 class AuthenticationError(APIException):
     """Authentication failed"""
     
+    __slots__ = ()
+    
     def __init__(self, detail: str = "Authentication failed"):
         super().__init__(
             status_code=401,
@@ -43,6 +55,8 @@ class AuthenticationError(APIException):
 class InvalidTokenError(APIException):
     """Invalid or expired token"""
     
+    __slots__ = ()
+    
     def __init__(self, detail: str = "Invalid or expired token"):
         super().__init__(
             status_code=401,
@@ -54,6 +68,8 @@ class InvalidTokenError(APIException):
 class PermissionDeniedError(APIException):
     """User doesn't have permission"""
     
+    __slots__ = ()
+    
     def __init__(self, detail: str = "Permission denied"):
         super().__init__(
             status_code=403,
@@ -69,6 +85,8 @@ class PermissionDeniedError(APIException):
 class NotFoundError(APIException):
     """Resource not found"""
     
+    __slots__ = ()
+    
     def __init__(
         self,
         resource: str = "Resource",
@@ -89,6 +107,8 @@ class NotFoundError(APIException):
 class AlreadyExistsError(APIException):
     """Resource already exists"""
     
+    __slots__ = ()
+    
     def __init__(
         self,
         resource: str = "Resource",
@@ -114,6 +134,8 @@ class AlreadyExistsError(APIException):
 class ValidationError(APIException):
     """Validation failed"""
     
+    __slots__ = ()
+    
     def __init__(
         self,
         detail: str = "Validation failed",
@@ -130,6 +152,8 @@ class ValidationError(APIException):
 class InvalidFileError(APIException):
     """Invalid file uploaded"""
     
+    __slots__ = ()
+    
     def __init__(
         self,
         detail: str = "Invalid file",
@@ -147,6 +171,8 @@ class InvalidFileError(APIException):
 class FileTooLargeError(APIException):
     """File exceeds size limit"""
     
+    __slots__ = ()
+    
     def __init__(
         self,
         max_size: int,
@@ -172,6 +198,8 @@ class FileTooLargeError(APIException):
 class ProcessingError(APIException):
     """Error during data processing"""
     
+    __slots__ = ()
+    
     def __init__(
         self,
         detail: str = "Processing failed",
@@ -188,6 +216,8 @@ class ProcessingError(APIException):
 class AnalysisError(APIException):
     """Error during data analysis"""
     
+    __slots__ = ()
+    
     def __init__(
         self,
         detail: str = "Analysis failed",
@@ -201,6 +231,24 @@ class AnalysisError(APIException):
         )
 
 
+class UploadFailedError(APIException):
+    """Uploaded file could not be parsed or profiled"""
+    
+    __slots__ = ()
+    
+    def __init__(
+        self,
+        detail: str = "Upload failed",
+        upload_id: Optional[str] = None,
+    ):
+        super().__init__(
+            status_code=409,
+            code="UPLOAD_FAILED",
+            detail=detail,
+            details={"upload_id": upload_id},
+        )
+
+
 # ===========================================
 # AI Service Exceptions
 # ===========================================
@@ -208,6 +256,8 @@ class AnalysisError(APIException):
 class AIServiceError(APIException):
     """AI service error"""
     
+    __slots__ = ()
+    
     def __init__(
         self,
         detail: str = "AI service error",
@@ -224,6 +274,8 @@ class AIServiceError(APIException):
 class AIRateLimitError(APIException):
     """AI service rate limit exceeded"""
     
+    __slots__ = ()
+    
     def __init__(
         self,
         detail: str = "AI service rate limit exceeded",
@@ -244,6 +296,8 @@ class AIRateLimitError(APIException):
 class RateLimitExceededError(APIException):
     """Rate limit exceeded"""
     
+    __slots__ = ()
+    
     def __init__(
         self,
         limit: int,
@@ -0,0 +1,49 @@
+"""
+Logging Setup
+Loguru sinks shared by the API process and analysis worker processes
+"""
+
+from loguru import logger
+import sys
+
+from app.config import settings
+
+
+def configure_logging(file_sink: bool = True) -> None:
+    """
+    Replace loguru's default stderr sink with the configured ones
+
+    Called at import time by app.main and as the initializer of analysis
+    worker processes, which are spawned and never import app.main.
+
+    Args:
+        file_sink: Also write logs/app.log in production. Workers pass False
+            so only one process rotates the file.
+    """
+    logger.remove()
+    if settings.is_development:
+        logger.add(
+            sys.stdout,
+            format="<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level: <8}</level> | <cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>",
+            level=settings.LOG_LEVEL,
+            colorize=True,
+        )
+    else:
+        # One uncolored JSON object per line; request fields land in "extra"
+        logger.add(
+            sys.stdout,
+            format="{time:YYYY-MM-DDTHH:mm:ss.SSSZ} {level} {message}",
+            level=settings.LOG_LEVEL,
+            colorize=False,
+            serialize=True,
+        )
+
+    # Add file logging in production
+    if file_sink and settings.ENVIRONMENT == "production":
+        logger.add(
+            "logs/app.log",
+            rotation="500 MB",
+            retention="10 days",
+            compression="zip",
+            level="INFO",
+        )
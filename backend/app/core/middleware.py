@@ -0,0 +1,45 @@
+"""
+HTTP Middleware
+"""
+
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import GZipMiddleware, GZipResponder
+from starlette.types import Message, Receive, Scope, Send
+
+
+class _StreamAwareGZipResponder(GZipResponder):
+    """
+    GZip responder that passes event streams through uncompressed
+
+    The gzip encoder holds small writes until it has a full block, so each
+    SSE event would sit in its buffer instead of reaching the client.
+
+    GZipResponder, send_with_gzip and content_encoding_set are Starlette
+    internals, which is why requirements.txt pins starlette exactly; check
+    this class when upgrading it.
+    """
+
+    async def send_with_gzip(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            content_type = Headers(raw=message["headers"]).get("content-type", "")
+            if content_type.startswith("text/event-stream"):
+                self.initial_message = message
+                # Same path GZipResponder takes for already-encoded bodies
+                self.content_encoding_set = True
+                return
+        await super().send_with_gzip(message)
+
+
+class StreamAwareGZipMiddleware(GZipMiddleware):
+    """
+    GZipMiddleware that leaves text/event-stream responses unbuffered
+    """
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http" and "gzip" in Headers(scope=scope).get("Accept-Encoding", ""):
+            responder = _StreamAwareGZipResponder(
+                self.app, self.minimum_size, compresslevel=self.compresslevel
+            )
+            await responder(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
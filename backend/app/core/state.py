@@ -0,0 +1,148 @@
+"""
+Shared State Store
+Keeps uploads, analyses and chat sessions outside the worker process
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+import time
+
+import msgpack
+import numpy as np
+from loguru import logger
+
+from app.config import settings
+
+
+def _pack_default(obj: Any) -> Any:
+    """
+    Convert values msgpack can't encode natively (numpy scalars)
+    """
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f"Cannot serialize object of type {type(obj).__name__}")
+
+
+class StateStore:
+    """
+    Namespaced key-value store for API state
+
+    Records are msgpack-encoded and stored in Redis when STATE_BACKEND is
+    "redis", or in a process-local dict otherwise. Both backends hand out
+    decoded copies, so callers must write changes back with `set`.
+    """
+
+    def __init__(self, backend: str = "memory", ttl: int = 86400):
+        """
+        Initialize state store
+
+        Args:
+            backend: "memory" or "redis"
+            ttl: Default record lifetime in seconds
+        """
+        self.backend = backend
+        self.ttl = ttl
+        self._redis = None
+        self._memory: Dict[str, Tuple[float, bytes]] = {}
+
+        if backend == "redis":
+            import redis.asyncio as redis
+            self._redis = redis.from_url(settings.REDIS_URL)
+
+    @staticmethod
+    def _key(namespace: str, key: str) -> str:
+        return f"{namespace}:{key}"
+
+    @staticmethod
+    def _pack(value: Dict[str, Any]) -> bytes:
+        return msgpack.packb(value, use_bin_type=True, default=_pack_default)
+
+    @staticmethod
+    def _unpack(raw: bytes) -> Dict[str, Any]:
+        return msgpack.unpackb(raw, raw=False)
+
+    async def get(self, namespace: str, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Get a record, or None if it doesn't exist or has expired
+        """
+
+        full_key = self._key(namespace, key)
+
+        if self._redis is not None:
+            raw = await self._redis.get(full_key)
+        else:
+            entry = self._memory.get(full_key)
+            raw = None
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    raw = entry[1]
+                else:
+                    del self._memory[full_key]
+
+        return self._unpack(raw) if raw is not None else None
+
+    async def set(
+        self,
+        namespace: str,
+        key: str,
+        value: Dict[str, Any],
+        ttl: Optional[int] = None,
+    ) -> None:
+        """
+        Create or replace a record
+        """
+
+        full_key = self._key(namespace, key)
+        raw = self._pack(value)
+        ttl = ttl or self.ttl
+
+        if self._redis is not None:
+            await self._redis.set(full_key, raw, ex=ttl)
+        else:
+            self._memory[full_key] = (time.monotonic() + ttl, raw)
+
+    async def delete(self, namespace: str, key: str) -> bool:
+        """
+        Delete a record
+
+        Returns:
+            True if the record existed
+        """
+
+        full_key = self._key(namespace, key)
+
+        if self._redis is not None:
+            return bool(await self._redis.delete(full_key))
+        return self._memory.pop(full_key, None) is not None
+
+    async def values(self, namespace: str) -> List[Dict[str, Any]]:
+        """
+        Get every live record in a namespace
+        """
+
+        prefix = self._key(namespace, "")
+
+        if self._redis is not None:
+            keys = [k async for k in self._redis.scan_iter(match=f"{prefix}*", count=500)]
+            if not keys:
+                return []
+            raws = await self._redis.mget(keys)
+        else:
+            now = time.monotonic()
+            raws = [
+                raw for k, (expires, raw) in list(self._memory.items())
+                if k.startswith(prefix) and expires > now
+            ]
+
+        return [self._unpack(raw) for raw in raws if raw is not None]
+
+    async def close(self) -> None:
+        """
+        Release the Redis connection pool
+        """
+        if self._redis is not None:
+            await self._redis.aclose()
+            logger.info("State store connection closed")
+
+
+# Global state store instance
+state = StateStore(backend=settings.STATE_BACKEND, ttl=settings.STATE_TTL)
@@ -0,0 +1,32 @@
+"""
+Timestamp Helpers
+Cheap ISO-8601 UTC timestamps for API records
+"""
+
+from datetime import datetime, timezone
+import time
+
+
+# Last formatted whole second, reused until the clock moves on
+_last_second: int = -1
+_last_prefix: str = ""
+
+
+def utc_now_iso() -> str:
+    """
+    Current UTC time as an ISO-8601 string with microseconds
+
+    Equivalent to `datetime.utcnow().isoformat()`, but the date/time part is
+    only formatted once per second; the microsecond suffix is integer math.
+    """
+    global _last_second, _last_prefix
+
+    now_us = time.time_ns() // 1000
+    second, micros = divmod(now_us, 1_000_000)
+
+    prefix = _last_prefix
+    if second != _last_second:
+        prefix = datetime.fromtimestamp(second, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S")
+        _last_second, _last_prefix = second, prefix
+
+    return f"{prefix}.{micros:06d}"
@@ -3,38 +3,30 @@ AI Analyst Backend - FastAPI Application
 """
 
 from contextlib import asynccontextmanager
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.middleware.gzip import GZipMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
+from starlette.exceptions import HTTPException as StarletteHTTPException
+from functools import lru_cache
 from loguru import logger
+import asyncio
+import orjson
+import secrets
 import time
-import sys
 
 from app.config import settings
 from app.api.v1.router import api_router
 from app.core.exceptions import APIException
+from app.core.logging_config import configure_logging
+from app.core.middleware import StreamAwareGZipMiddleware
+from app.core.state import state
+from app.api.v1.analysis import shutdown_analysis_pool
+from app.services.ai_service import AIService, close_http_client
 
 # ===========================================
 # Configure Logging
 # ===========================================
-logger.remove()
-logger.add(
-    sys.stdout,
-    format="<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level: <8}</level> | <cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>",
-    level=settings.LOG_LEVEL,
-    colorize=True,
-)
-
-# Add file logging in production
-if settings.ENVIRONMENT == "production":
-    logger.add(
-        "logs/app.log",
-        rotation="500 MB",
-        retention="10 days",
-        compression="zip",
-        level="INFO",
-    )
+configure_logging()
 
 
 # ===========================================
@@ -52,11 +44,15 @@ async def lifespan(app: FastAPI):
     # Initialize database connection pool (if needed)
     # await database.connect()
     
-    # Initialize Redis connection (if needed)
-    # await redis.connect()
+    logger.info(f"State backend: {settings.STATE_BACKEND}")
+    
+    # Open AI provider connections in the background (best-effort)
+    warmup = asyncio.create_task(AIService().warmup())
     
     yield
     
+    warmup.cancel()
+    
     # Shutdown
     logger.info("Shutting down AI Analyst API")
     
@@ -64,7 +60,13 @@ async def lifespan(app: FastAPI):
     # await database.disconnect()
     
     # Close Redis connections
-    # await redis.close()
+    await state.close()
+    
+    # Close AI provider connections
+    await close_http_client()
+    
+    # Stop analysis worker processes
+    shutdown_analysis_pool()
 
 
 # ===========================================
@@ -77,6 +79,7 @@ app = FastAPI(
     docs_url="/docs" if settings.ENVIRONMENT != "production" else None,
     redoc_url="/redoc" if settings.ENVIRONMENT != "production" else None,
     openapi_url="/openapi.json" if settings.ENVIRONMENT != "production" else None,
+    default_response_class=ORJSONResponse,
     lifespan=lifespan,
 )
 
@@ -85,41 +88,45 @@ app = FastAPI(
 # Middleware
 # ===========================================
 
-# CORS Middleware
+# CORS Middleware (origins as a set: checked on every request)
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=settings.CORS_ORIGINS,
+    allow_origins=frozenset(settings.CORS_ORIGINS),
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
 )
 
-# GZip Compression
-app.add_middleware(GZipMiddleware, minimum_size=1000)
+# GZip Compression (level 1: several times faster than the default 9 on
+# large previews, for a slightly larger payload). Chat event streams are
+# sent uncompressed so each chunk is flushed as soon as it is produced.
+app.add_middleware(StreamAwareGZipMiddleware, minimum_size=1000, compresslevel=1)
 
 
 # Request Logging Middleware
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
     """Log all incoming requests"""
-    start_time = time.time()
+    start_ns = time.perf_counter_ns()
     
-    # Generate request ID
-    request_id = request.headers.get("X-Request-ID", str(time.time()))
-    
-    # Log request
-    logger.info(f"[{request_id}] {request.method} {request.url.path}")
+    # Use the caller's request ID, or generate a random one
+    request_id = request.headers.get("X-Request-ID") or secrets.token_hex(8)
     
     # Process request
     response = await call_next(request)
     
-    # Calculate duration
-    duration = time.time() - start_time
+    # Calculate duration (monotonic clock)
+    duration = (time.perf_counter_ns() - start_ns) / 1e9
     
-    # Log response
+    # Log once per request; keyword args are formatted lazily and also
+    # recorded as structured fields
     logger.info(
-        f"[{request_id}] {request.method} {request.url.path} "
-        f"- {response.status_code} ({duration:.3f}s)"
+        "[{request_id}] {method} {path} - {status} ({duration:.3f}s)",
+        request_id=request_id,
+        method=request.method,
+        path=request.url.path,
+        status=response.status_code,
+        duration=duration,
     )
     
     # Add headers
@@ -133,36 +140,73 @@ async def log_requests(request: Request, call_next):
 # Exception Handlers
 # ===========================================
 
+# Error codes for HTTPExceptions raised by routes (and Starlette's own 404/405)
+HTTP_ERROR_CODES = {
+    400: "BAD_REQUEST",
+    401: "AUTHENTICATION_ERROR",
+    403: "PERMISSION_DENIED",
+    404: "NOT_FOUND",
+    405: "METHOD_NOT_ALLOWED",
+    409: "ALREADY_EXISTS",
+    429: "RATE_LIMIT_EXCEEDED",
+    500: "INTERNAL_ERROR",
+}
+
+
+@lru_cache(maxsize=256)
+def error_body(code: str, message: str) -> bytes:
+    """
+    Encoded error envelope; most messages are constants, so cache the bytes
+    """
+    return orjson.dumps({
+        "success": False,
+        "error": {
+            "code": code,
+            "message": message,
+        },
+    })
+
+
 @app.exception_handler(APIException)
 async def api_exception_handler(request: Request, exc: APIException):
     """Handle custom API exceptions"""
     logger.error(f"API Error: {exc.detail}")
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=exc.status_code,
         content={
             "success": False,
             "error": {
                 "code": exc.code,
                 "message": exc.detail,
-                "details": exc.details,
+                "details": dict(exc.details),
             },
         },
     )
 
 
+@app.exception_handler(StarletteHTTPException)
+async def http_exception_handler(request: Request, exc: StarletteHTTPException):
+    """Wrap HTTPExceptions in the same error envelope as API exceptions"""
+    if exc.status_code in (204, 304):
+        return Response(status_code=exc.status_code, headers=exc.headers)
+    
+    code = HTTP_ERROR_CODES.get(exc.status_code, "HTTP_ERROR")
+    return Response(
+        content=error_body(code, str(exc.detail)),
+        status_code=exc.status_code,
+        headers=exc.headers,
+        media_type="application/json",
+    )
+
+
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
     """Handle unexpected exceptions"""
     logger.exception(f"Unexpected error: {exc}")
-    return JSONResponse(
+    return Response(
+        content=error_body("INTERNAL_ERROR", "An unexpected error occurred"),
         status_code=500,
-        content={
-            "success": False,
-            "error": {
-                "code": "INTERNAL_ERROR",
-                "message": "An unexpected error occurred",
-            },
-        },
+        media_type="application/json",
     )
 
 
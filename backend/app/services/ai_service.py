@@ -3,19 +3,260 @@ AI Service
 Integrates with OpenAI and Anthropic Claude APIs
 """
 
-from typing import AsyncGenerator, List, Dict, Any, Optional
+from typing import AsyncGenerator, Awaitable, Callable, List, Dict, Any, Optional, Tuple
+from functools import lru_cache
+from cachetools import TTLCache
 from loguru import logger
 import asyncio
+import httpx
+import hashlib
+import random
+import re
+import time
+import orjson
 
 from app.config import settings
 from app.core.exceptions import AIServiceError, AIRateLimitError
 
 
+# ===========================================
+# Response cache (per worker process)
+# ===========================================
+# Keyed by a hash of provider, model, sampling parameters and messages.
+# Only completed provider responses are stored; mock answers and streams are not.
+_response_cache: TTLCache = TTLCache(maxsize=settings.AI_CACHE_SIZE, ttl=settings.AI_CACHE_TTL)
+_cache_stats = {"hits": 0, "misses": 0}
+
+
+# ===========================================
+# Shared HTTP connection pool
+# ===========================================
+# One keep-alive pool for every AIService instance (and both providers), so
+# requests reuse warm TCP/TLS connections instead of each instance opening
+# its own. httpx pools are bound to the event loop they were first used on,
+# so a new one is created if the loop changes. Analysis worker processes run
+# a fresh loop per job and close the client before that loop ends.
+_http_client: Optional[httpx.AsyncClient] = None
+_http_client_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def shared_http_client() -> httpx.AsyncClient:
+    """
+    Get the process-wide HTTP client for AI provider requests
+    """
+    global _http_client, _http_client_loop
+
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = None
+    if _http_client is None or _http_client_loop is not loop:
+        try:
+            import h2  # noqa: F401
+            http2 = True
+        except ImportError:
+            http2 = False
+        _http_client = httpx.AsyncClient(
+            http2=http2,
+            timeout=httpx.Timeout(600.0, connect=10.0),
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=50),
+        )
+        _http_client_loop = loop
+    return _http_client
+
+
+async def close_http_client() -> None:
+    """
+    Close the shared HTTP client and drop the SDK clients built on it
+    (application shutdown, end of an analysis job)
+    """
+    global _http_client, _http_client_loop
+
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = _http_client_loop = None
+        _openai_client.cache_clear()
+        _anthropic_client.cache_clear()
+
+
+@lru_cache(maxsize=1)
+def _openai_client(http_client: httpx.AsyncClient):
+    """
+    OpenAI SDK client on `http_client`, or None if the package is missing
+    """
+    try:
+        from openai import AsyncOpenAI
+    except ImportError:
+        logger.error("OpenAI package not installed")
+        return None
+    return AsyncOpenAI(api_key=settings.OPENAI_API_KEY, max_retries=0, http_client=http_client)
+
+
+@lru_cache(maxsize=1)
+def _anthropic_client(http_client: httpx.AsyncClient):
+    """
+    Anthropic SDK client on `http_client`, or None if the package is missing
+    """
+    try:
+        from anthropic import AsyncAnthropic
+    except ImportError:
+        logger.error("Anthropic package not installed")
+        return None
+    return AsyncAnthropic(api_key=settings.ANTHROPIC_API_KEY, max_retries=0, http_client=http_client)
+
+
+# ===========================================
+# Mock responses (no AI provider configured)
+# ===========================================
+# Keyword stems -> topic, matched case-insensitively anywhere in the message.
+# When several topics are mentioned, the one listed first here wins.
+_MOCK_TOPICS = {
+    "trend": "trend",
+    "anomal": "anomaly",
+    "outlier": "anomaly",
+    "recommend": "recommendation",
+    "suggest": "recommendation",
+    "correlation": "correlation",
+}
+_MOCK_TOPIC_PATTERN = re.compile(f"({'|'.join(_MOCK_TOPICS)})", re.IGNORECASE)
+
+_MOCK_RESPONSES = {
+    "trend": (
+        "Based on the data analysis, **revenue shows a consistent upward trend** "
+        "with an average monthly growth of 15.3%.\n\n"
+        "• Q2 shows the strongest performance\n"
+        "• June is typically the peak month\n"
+        "• Year-over-year growth is 23.5%"
+    ),
+    "anomaly": (
+        "I detected **several anomalies** in your data:\n\n"
+        "• March 15th shows a 340% spike in order volume\n"
+        "• This correlates with the Spring promotional campaign\n"
+        "• 2.3% of transactions are statistical outliers"
+    ),
+    "recommendation": (
+        "Based on the analysis, here are my **recommendations**:\n\n"
+        "• Focus marketing efforts on the Electronics category (+42% growth)\n"
+        "• Increase inventory for the East region (highest performer)\n"
+        "• Consider price optimization for the $20-50 range (best conversion)"
+    ),
+    "correlation": (
+        "I found **strong correlations** in your data:\n\n"
+        "• Price and Quantity: -0.73 (negative correlation)\n"
+        "• Marketing Spend and Revenue: 0.89 (strong positive)\n"
+        "• Customer Age and Order Value: 0.45 (moderate positive)"
+    ),
+}
+_MOCK_DEFAULT_RESPONSE = (
+    "Based on my analysis of your data:\n\n"
+    "**Key Findings:**\n"
+    "• Total revenue: $48,200 (+23.5% vs previous period)\n"
+    "• Top category: Electronics (35% of revenue)\n"
+    "• Best performing region: East ($15,200)\n\n"
+    "Would you like me to dive deeper into any specific area?"
+)
+
+
+# ===========================================
+# Token counting
+# ===========================================
+
+@lru_cache()
+def _token_encoder():
+    """
+    tiktoken encoding for the OpenAI model, or None if unavailable
+
+    Also used as an approximation for Anthropic models. tiktoken downloads
+    its tables on first use, so this can fail offline.
+    """
+    try:
+        import tiktoken
+        try:
+            return tiktoken.encoding_for_model(settings.OPENAI_MODEL)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        logger.warning(f"tiktoken unavailable ({e}), estimating tokens from length")
+        return None
+
+
+def _count_tokens(text: str) -> int:
+    """
+    Tokens in `text`, or roughly len/4 without tiktoken
+    """
+    encoder = _token_encoder()
+    if encoder is None:
+        return len(text) // 4 + 1
+    return len(encoder.encode(text, disallowed_special=()))
+
+
+# ===========================================
+# Retry helpers
+# ===========================================
+
+# HTTP statuses worth retrying besides 429 and 5xx (timeouts, lock conflicts)
+_RETRYABLE_STATUSES = frozenset({408, 409})
+
+
+@lru_cache()
+def _sdk_error_types() -> Tuple[Tuple[type, ...], Tuple[type, ...]]:
+    """
+    (always-retryable errors, HTTP status errors) from whichever SDKs are installed
+    """
+    transient: List[type] = []
+    status: List[type] = []
+    for module_name in ("openai", "anthropic"):
+        try:
+            module = __import__(module_name)
+        except ImportError:
+            continue
+        transient += [module.RateLimitError, module.APIConnectionError]
+        status.append(module.APIStatusError)
+    return tuple(transient), tuple(status)
+
+
+def _is_retryable(error: Exception) -> bool:
+    """
+    Whether a provider error is transient: rate limits, timeouts, dropped
+    connections, 408/409 and 5xx responses (including Anthropic's 529
+    "overloaded")
+    """
+    transient, status = _sdk_error_types()
+    if isinstance(error, transient):
+        return True
+    if isinstance(error, status):
+        code = error.status_code
+        return code >= 500 or code in _RETRYABLE_STATUSES
+    return False
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """
+    Seconds the provider asked us to wait, from the Retry-After header
+    """
+    response = getattr(error, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
 class AIService:
     """
     Service for AI-powered features using OpenAI or Anthropic
     """
     
+    # Retries for transient provider errors: up to MAX_RETRIES after the first
+    # try, with decorrelated-jitter backoff starting at RETRY_BASE_DELAY
+    # seconds, capped at RETRY_MAX_DELAY
+    MAX_RETRIES = 7
+    RETRY_BASE_DELAY = 0.3
+    RETRY_MAX_DELAY = 30.0
+    
+    # Framing tokens counted per message on top of its content
+    MESSAGE_OVERHEAD_TOKENS = 4
+    
     def __init__(self, provider: Optional[str] = None):
         """
         Initialize AI service
@@ -24,36 +265,96 @@ class AIService:
             provider: "openai" or "anthropic" (defaults to settings)
         """
         self.provider = provider or settings.AI_PROVIDER
-        self._openai_client = None
-        self._anthropic_client = None
+        
+        # SDK clients are built once per process (per shared HTTP pool) and
+        # only looked up here
+        http_client = (
+            shared_http_client()
+            if settings.OPENAI_API_KEY or settings.ANTHROPIC_API_KEY
+            else None
+        )
+        self.openai_client = _openai_client(http_client) if settings.OPENAI_API_KEY else None
+        self.anthropic_client = _anthropic_client(http_client) if settings.ANTHROPIC_API_KEY else None
+        
+        # Provider requests actually go to: the configured one if it has a
+        # client, else OpenAI if available, else None (mock responses)
+        if self.provider == "anthropic" and self.anthropic_client:
+            self.active_provider = "anthropic"
+            self._chat_impl, self._stream_impl = self._chat_anthropic, self._stream_anthropic
+        elif self.openai_client:
+            self.active_provider = "openai"
+            self._chat_impl, self._stream_impl = self._chat_openai, self._stream_openai
+        else:
+            self.active_provider = None
+            self._chat_impl = self._stream_impl = None
+        
+        # Bounds in-flight provider requests for the batch helpers
+        self._semaphore = asyncio.Semaphore(settings.AI_MAX_CONCURRENCY)
     
-    @property
-    def openai_client(self):
-        """Lazy-load OpenAI client"""
-        if self._openai_client is None and settings.OPENAI_API_KEY:
+    async def warmup(self) -> None:
+        """
+        Open connections to the configured providers ahead of the first request
+        
+        Best-effort: loads the tokenizer used to trim prompts, then sends a
+        HEAD to each provider's API host through the shared pool so the first
+        real call skips DNS, TCP and TLS setup. Errors are logged and ignored.
+        """
+        
+        clients = [c for c in (self.openai_client, self.anthropic_client) if c is not None]
+        if not clients:
+            return
+        
+        http_client = shared_http_client()
+        
+        async def ping(client) -> bool:
             try:
-                from openai import AsyncOpenAI
-                self._openai_client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
-            except ImportError:
-                logger.error("OpenAI package not installed")
-        return self._openai_client
+                await http_client.head(str(client.base_url), timeout=5.0)
+                return True
+            except Exception as e:
+                logger.debug(f"AI provider warmup failed for {client.base_url}: {e}")
+                return False
+        
+        # Load the tokenizer (may download its tables) off the event loop
+        await asyncio.to_thread(_token_encoder)
+        
+        warmed = sum(await asyncio.gather(*[ping(c) for c in clients]))
+        logger.info(f"Warmed up {warmed}/{len(clients)} AI provider connection(s)")
     
-    @property
-    def anthropic_client(self):
-        """Lazy-load Anthropic client"""
-        if self._anthropic_client is None and settings.ANTHROPIC_API_KEY:
-            try:
-                from anthropic import AsyncAnthropic
-                self._anthropic_client = AsyncAnthropic(api_key=settings.ANTHROPIC_API_KEY)
-            except ImportError:
-                logger.error("Anthropic package not installed")
-        return self._anthropic_client
+    @staticmethod
+    def cache_info() -> Dict[str, int]:
+        """
+        Hit/miss counters and occupancy of the response cache
+        """
+        return {
+            **_cache_stats,
+            "size": len(_response_cache),
+            "maxsize": int(_response_cache.maxsize),
+            "ttl": int(_response_cache.ttl),
+        }
+    
+    def _cache_key(
+        self,
+        provider: str,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        max_tokens: Optional[int],
+    ) -> str:
+        """
+        Stable digest of everything that determines a provider's answer
+        """
+        model = settings.ANTHROPIC_MODEL if provider == "anthropic" else settings.OPENAI_MODEL
+        payload = orjson.dumps(
+            (provider, model, temperature, max_tokens, messages),
+            option=orjson.OPT_SORT_KEYS,
+        )
+        return hashlib.blake2b(payload, digest_size=16).hexdigest()
     
     async def chat(
         self, 
         messages: List[Dict[str, str]],
         temperature: float = 0.7,
         max_tokens: Optional[int] = None,
+        bypass_cache: bool = False,
     ) -> str:
         """
         Send a chat message and get a response
@@ -62,19 +363,34 @@ class AIService:
             messages: List of message dicts with 'role' and 'content'
             temperature: Creativity parameter (0-1)
             max_tokens: Maximum response tokens
+            bypass_cache: Always ask the provider, ignoring cached responses
             
         Returns:
             AI response text
         """
         
-        if self.provider == "anthropic" and self.anthropic_client:
-            return await self._chat_anthropic(messages, temperature, max_tokens)
-        elif self.openai_client:
-            return await self._chat_openai(messages, temperature, max_tokens)
-        else:
+        call = self._chat_impl
+        if call is None:
             # Fallback to mock response
             logger.warning("No AI provider configured, using mock response")
             return self._mock_response(messages)
+        
+        messages = self._fit_context(messages, max_tokens)
+        
+        if bypass_cache:
+            return await call(messages, temperature, max_tokens)
+        
+        key = self._cache_key(self.active_provider, messages, temperature, max_tokens)
+        cached = _response_cache.get(key)
+        if cached is not None:
+            _cache_stats["hits"] += 1
+            return cached
+        
+        _cache_stats["misses"] += 1
+        response = await call(messages, temperature, max_tokens)
+        if response is not None:
+            _response_cache[key] = response
+        return response
     
     async def chat_stream(
         self, 
@@ -88,18 +404,83 @@ class AIService:
             Chunks of the AI response
         """
         
-        if self.provider == "anthropic" and self.anthropic_client:
-            async for chunk in self._stream_anthropic(messages, temperature):
-                yield chunk
-        elif self.openai_client:
-            async for chunk in self._stream_openai(messages, temperature):
+        if self._stream_impl is not None:
+            messages = self._fit_context(messages, None)
+            async for chunk in self._stream_impl(messages, temperature):
                 yield chunk
         else:
-            # Mock streaming response
-            mock = self._mock_response(messages)
-            for word in mock.split():
-                yield word + " "
-                await asyncio.sleep(0.05)
+            # Mock streaming response, a line at a time with no artificial delay
+            for line in self._mock_response(messages).splitlines(keepends=True):
+                yield line
+    
+    def _fit_context(
+        self,
+        messages: List[Dict[str, str]],
+        max_tokens: Optional[int],
+    ) -> List[Dict[str, str]]:
+        """
+        Drop the oldest non-system messages until the prompt fits
+        
+        The budget is AI_CONTEXT_TOKENS minus the tokens reserved for the
+        reply. System messages and the latest message are always kept.
+        """
+        
+        reply_tokens = max_tokens or (
+            settings.ANTHROPIC_MAX_TOKENS if self.active_provider == "anthropic"
+            else settings.OPENAI_MAX_TOKENS
+        )
+        budget = settings.AI_CONTEXT_TOKENS - reply_tokens
+        
+        # Content plus a few tokens of per-message framing
+        costs = [_count_tokens(m["content"]) + self.MESSAGE_OVERHEAD_TOKENS for m in messages]
+        total = sum(costs)
+        if total <= budget:
+            return messages
+        
+        keep = [True] * len(messages)
+        for i, msg in enumerate(messages[:-1]):
+            if total <= budget:
+                break
+            if msg["role"] != "system":
+                keep[i] = False
+                total -= costs[i]
+        
+        trimmed = [m for m, k in zip(messages, keep) if k]
+        logger.info(
+            f"Dropped {len(messages) - len(trimmed)} oldest messages to fit "
+            f"{budget:,} prompt tokens"
+        )
+        return trimmed
+    
+    async def _with_retries(self, request: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Await a provider request, retrying transient errors
+        
+        Waits the provider's Retry-After when it sends one, otherwise a random
+        delay between RETRY_BASE_DELAY and three times the previous delay. Gives
+        up after MAX_RETRIES retries, or as soon as Retry-After exceeds
+        RETRY_MAX_DELAY, re-raising the last error.
+        """
+        
+        delay = self.RETRY_BASE_DELAY
+        
+        for retry in range(self.MAX_RETRIES + 1):
+            try:
+                return await request()
+            except Exception as e:
+                if not _is_retryable(e):
+                    raise
+                retry_after = _retry_after(e)
+                if retry == self.MAX_RETRIES or (retry_after or 0) > self.RETRY_MAX_DELAY:
+                    raise
+                
+                delay = min(self.RETRY_MAX_DELAY, random.uniform(self.RETRY_BASE_DELAY, delay * 3))
+                wait = retry_after if retry_after is not None else delay
+                logger.warning(
+                    f"{type(e).__name__} from {self.provider} "
+                    f"(retry {retry + 1}/{self.MAX_RETRIES}), retrying in {wait:.2f}s"
+                )
+                await asyncio.sleep(wait)
     
     async def _chat_openai(
         self, 
@@ -112,11 +493,13 @@ class AIService:
         """
         
         try:
-            response = await self.openai_client.chat.completions.create(
-                model=settings.OPENAI_MODEL,
-                messages=messages,
-                temperature=temperature,
-                max_tokens=max_tokens or settings.OPENAI_MAX_TOKENS,
+            response = await self._with_retries(
+                lambda: self.openai_client.chat.completions.create(
+                    model=settings.OPENAI_MODEL,
+                    messages=messages,
+                    temperature=temperature,
+                    max_tokens=max_tokens or settings.OPENAI_MAX_TOKENS,
+                )
             )
             
             return response.choices[0].message.content
@@ -124,10 +507,32 @@ class AIService:
         except Exception as e:
             error_str = str(e).lower()
             if "rate limit" in error_str:
-                raise AIRateLimitError(detail=str(e), retry_after=60)
+                raise AIRateLimitError(detail=str(e), retry_after=int(_retry_after(e) or 60))
             logger.exception(f"OpenAI API error: {e}")
             raise AIServiceError(detail=str(e), provider="openai")
     
+    @staticmethod
+    def _split_system(
+        messages: List[Dict[str, str]],
+    ) -> Tuple[Optional[str], List[Dict[str, str]]]:
+        """
+        Split messages into Anthropic's separate system prompt and turns
+        
+        Returns:
+            (last system message or None, remaining messages as role/content)
+        """
+        
+        system_msg = None
+        claude_messages = []
+        
+        for msg in messages:
+            if msg["role"] == "system":
+                system_msg = msg["content"]
+            else:
+                claude_messages.append({"role": msg["role"], "content": msg["content"]})
+        
+        return system_msg, claude_messages
+    
     async def _chat_anthropic(
         self, 
         messages: List[Dict[str, str]],
@@ -139,25 +544,16 @@ class AIService:
         """
         
         try:
-            # Convert messages format for Anthropic
-            system_msg = None
-            claude_messages = []
+            system_msg, claude_messages = self._split_system(messages)
             
-            for msg in messages:
-                if msg["role"] == "system":
-                    system_msg = msg["content"]
-                else:
-                    claude_messages.append({
-                        "role": msg["role"],
-                        "content": msg["content"],
-                    })
-            
-            response = await self.anthropic_client.messages.create(
-                model=settings.ANTHROPIC_MODEL,
-                max_tokens=max_tokens or settings.ANTHROPIC_MAX_TOKENS,
-                system=system_msg or "You are a helpful data analyst assistant.",
-                messages=claude_messages,
-                temperature=temperature,
+            response = await self._with_retries(
+                lambda: self.anthropic_client.messages.create(
+                    model=settings.ANTHROPIC_MODEL,
+                    max_tokens=max_tokens or settings.ANTHROPIC_MAX_TOKENS,
+                    system=system_msg or "You are a helpful data analyst assistant.",
+                    messages=claude_messages,
+                    temperature=temperature,
+                )
             )
             
             return response.content[0].text
@@ -165,7 +561,7 @@ class AIService:
         except Exception as e:
             error_str = str(e).lower()
             if "rate limit" in error_str:
-                raise AIRateLimitError(detail=str(e), retry_after=60)
+                raise AIRateLimitError(detail=str(e), retry_after=int(_retry_after(e) or 60))
             logger.exception(f"Anthropic API error: {e}")
             raise AIServiceError(detail=str(e), provider="anthropic")
     
@@ -205,18 +601,7 @@ class AIService:
         """
         
         try:
-            # Convert messages format
-            system_msg = None
-            claude_messages = []
-            
-            for msg in messages:
-                if msg["role"] == "system":
-                    system_msg = msg["content"]
-                else:
-                    claude_messages.append({
-                        "role": msg["role"],
-                        "content": msg["content"],
-                    })
+            system_msg, claude_messages = self._split_system(messages)
             
             async with self.anthropic_client.messages.stream(
                 model=settings.ANTHROPIC_MODEL,
@@ -237,51 +622,17 @@ class AIService:
         Generate a mock response when no AI provider is configured
         """
         
-        user_message = ""
-        for msg in reversed(messages):
-            if msg["role"] == "user":
-                user_message = msg["content"].lower()
-                break
+        user_message = next(
+            (msg["content"] for msg in reversed(messages) if msg["role"] == "user"),
+            "",
+        )
         
-        # Generate contextual mock responses
-        if "trend" in user_message:
-            return (
-                "Based on the data analysis, **revenue shows a consistent upward trend** "
-                "with an average monthly growth of 15.3%.\n\n"
-                "• Q2 shows the strongest performance\n"
-                "• June is typically the peak month\n"
-                "• Year-over-year growth is 23.5%"
-            )
-        elif "anomal" in user_message or "outlier" in user_message:
-            return (
-                "I detected **several anomalies** in your data:\n\n"
-                "• March 15th shows a 340% spike in order volume\n"
-                "• This correlates with the Spring promotional campaign\n"
-                "• 2.3% of transactions are statistical outliers"
-            )
-        elif "recommend" in user_message or "suggest" in user_message:
-            return (
-                "Based on the analysis, here are my **recommendations**:\n\n"
-                "• Focus marketing efforts on the Electronics category (+42% growth)\n"
-                "• Increase inventory for the East region (highest performer)\n"
-                "• Consider price optimization for the $20-50 range (best conversion)"
-            )
-        elif "correlation" in user_message:
-            return (
-                "I found **strong correlations** in your data:\n\n"
-                "• Price and Quantity: -0.73 (negative correlation)\n"
-                "• Marketing Spend and Revenue: 0.89 (strong positive)\n"
-                "• Customer Age and Order Value: 0.45 (moderate positive)"
-            )
-        else:
-            return (
-                "Based on my analysis of your data:\n\n"
-                "**Key Findings:**\n"
-                "• Total revenue: $48,200 (+23.5% vs previous period)\n"
-                "• Top category: Electronics (35% of revenue)\n"
-                "• Best performing region: East ($15,200)\n\n"
-                "Would you like me to dive deeper into any specific area?"
-            )
+        # Answer for the highest-priority topic mentioned in the message
+        mentioned = {_MOCK_TOPICS[m.lower()] for m in _MOCK_TOPIC_PATTERN.findall(user_message)}
+        if not mentioned:
+            return _MOCK_DEFAULT_RESPONSE
+        topic = next(t for t in _MOCK_TOPICS.values() if t in mentioned)
+        return _MOCK_RESPONSES[topic]
     
     async def analyze_data(
         self, 
@@ -299,6 +650,227 @@ class AIService:
             Analysis text
         """
         
+        return await self.chat(self._analysis_messages(data_summary, question))
+    
+    async def explain_chart(
+        self, 
+        chart_config: Dict[str, Any],
+        data_context: str,
+    ) -> str:
+        """
+        Generate an explanation for a chart
+        
+        Args:
+            chart_config: Chart configuration
+            data_context: Context about the data
+            
+        Returns:
+            Explanation text
+        """
+        
+        return await self.chat(self._chart_messages(chart_config, data_context))
+    
+    async def analyze_data_batch(
+        self,
+        items: List[Tuple[str, Optional[str]]],
+        use_batch_api: bool = False,
+    ) -> List[Optional[str]]:
+        """
+        Run several `analyze_data` requests concurrently
+        
+        Args:
+            items: (data_summary, question) pairs
+            use_batch_api: Allow routing through the OpenAI Batch API (cheaper,
+                but may take up to 24h) when there are more than
+                AI_BATCH_THRESHOLD items
+            
+        Returns:
+            One analysis per item, in order; None where the request failed
+        """
+        
+        conversations = [
+            self._analysis_messages(summary, question) for summary, question in items
+        ]
+        
+        if (
+            use_batch_api
+            and len(conversations) > settings.AI_BATCH_THRESHOLD
+            and self.active_provider == "openai"
+        ):
+            results = await self.poll_batch(await self.submit_batch(conversations))
+            return [results.get(i) for i in range(len(conversations))]
+        
+        return await self._chat_batch(conversations)
+    
+    async def explain_chart_batch(
+        self,
+        chart_configs: List[Dict[str, Any]],
+        data_context: str,
+    ) -> List[Optional[str]]:
+        """
+        Explain several charts of the same dataset concurrently
+        
+        Args:
+            chart_configs: Chart configurations
+            data_context: Context about the data
+            
+        Returns:
+            One explanation per chart, in order; None where the request failed
+        """
+        
+        return await self._chat_batch([
+            self._chart_messages(config, data_context) for config in chart_configs
+        ])
+    
+    async def _chat_batch(self, batch: List[List[Dict[str, str]]]) -> List[Optional[str]]:
+        """
+        Send every conversation at once, at most AI_MAX_CONCURRENCY in flight
+        
+        Failed items are logged and returned as None; if every item fails, the
+        first error is raised.
+        """
+        
+        async def one(messages: List[Dict[str, str]]) -> str:
+            async with self._semaphore:
+                return await self.chat(messages)
+        
+        # All coroutines are created before anything is awaited, so the
+        # requests overlap instead of running back to back
+        results = await asyncio.gather(*[one(m) for m in batch], return_exceptions=True)
+        
+        errors = [r for r in results if isinstance(r, BaseException)]
+        if errors:
+            if len(errors) == len(results):
+                raise errors[0]
+            logger.warning(f"{len(errors)} of {len(results)} batched AI requests failed: {errors[0]}")
+        
+        return [None if isinstance(r, BaseException) else r for r in results]
+    
+    async def submit_batch(
+        self,
+        conversations: List[List[Dict[str, str]]],
+        temperature: float = 0.7,
+        max_tokens: Optional[int] = None,
+    ) -> str:
+        """
+        Submit conversations as one OpenAI Batch API job
+        
+        Args:
+            conversations: Message lists; each one's index is its custom_id
+            temperature: Creativity parameter (0-1)
+            max_tokens: Maximum response tokens
+            
+        Returns:
+            Batch ID to pass to `poll_batch`
+        """
+        
+        if not self.openai_client:
+            raise AIServiceError(detail="Batch API requires an OpenAI API key", provider="openai")
+        
+        lines = [
+            orjson.dumps({
+                "custom_id": str(i),
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {
+                    "model": settings.OPENAI_MODEL,
+                    "messages": messages,
+                    "temperature": temperature,
+                    "max_tokens": max_tokens or settings.OPENAI_MAX_TOKENS,
+                },
+            })
+            for i, messages in enumerate(conversations)
+        ]
+        
+        try:
+            # The pinned SDK predates typed batch methods, so the job itself
+            # is created through the client's generic request helper
+            batch_file = await self.openai_client.files.create(
+                file=("batch.jsonl", b"\n".join(lines) + b"\n"),
+                purpose="batch",
+            )
+            batch = await self.openai_client.post(
+                "/batches",
+                body={
+                    "input_file_id": batch_file.id,
+                    "endpoint": "/v1/chat/completions",
+                    "completion_window": "24h",
+                },
+                cast_to=object,
+            )
+        except Exception as e:
+            logger.exception(f"OpenAI batch submission failed: {e}")
+            raise AIServiceError(detail=str(e), provider="openai")
+        
+        logger.info(f"Submitted OpenAI batch {batch['id']} with {len(lines)} requests")
+        return batch["id"]
+    
+    async def poll_batch(
+        self,
+        batch_id: str,
+        timeout: float = 86400,
+    ) -> Dict[int, Optional[str]]:
+        """
+        Wait for an OpenAI batch job and collect its responses
+        
+        Polls with exponential backoff (2s doubling up to 60s, with jitter).
+        
+        Args:
+            batch_id: ID returned by `submit_batch`
+            timeout: Seconds to wait before giving up
+            
+        Returns:
+            Response text by conversation index; None for failed requests
+        """
+        
+        deadline = time.monotonic() + timeout
+        delay = 2.0
+        
+        try:
+            while True:
+                batch = await self.openai_client.get(f"/batches/{batch_id}", cast_to=object)
+                status = batch["status"]
+                if status in ("completed", "failed", "expired", "cancelled"):
+                    break
+                if time.monotonic() + delay > deadline:
+                    raise AIServiceError(
+                        detail=f"Batch {batch_id} still {status} after {timeout:.0f}s",
+                        provider="openai",
+                    )
+                await asyncio.sleep(delay * random.uniform(0.8, 1.2))
+                delay = min(delay * 2, 60.0)
+            
+            if not batch.get("output_file_id"):
+                raise AIServiceError(detail=f"Batch {batch_id} {status} without output", provider="openai")
+            
+            content = await self.openai_client.files.content(batch["output_file_id"])
+        except AIServiceError:
+            raise
+        except Exception as e:
+            logger.exception(f"OpenAI batch polling failed: {e}")
+            raise AIServiceError(detail=str(e), provider="openai")
+        
+        results: Dict[int, Optional[str]] = {}
+        for line in content.content.splitlines():
+            if not line.strip():
+                continue
+            record = orjson.loads(line)
+            body = (record.get("response") or {}).get("body") or {}
+            choices = body.get("choices")
+            results[int(record["custom_id"])] = choices[0]["message"]["content"] if choices else None
+        
+        logger.info(f"OpenAI batch {batch_id} {status}: {len(results)} responses")
+        return results
+    
+    def _analysis_messages(
+        self,
+        data_summary: str,
+        question: Optional[str],
+    ) -> List[Dict[str, str]]:
+        """
+        Build the conversation for `analyze_data`
+        """
+        
         prompt = f"""Analyze this data and provide insights:
 
 {data_summary}
@@ -310,25 +882,18 @@ Format your response with:
 - Specific numbers and percentages
 - Actionable recommendations"""
 
-        return await self.chat([
+        return [
             {"role": "system", "content": "You are an expert data analyst. Provide clear, actionable insights."},
             {"role": "user", "content": prompt},
-        ])
+        ]
     
-    async def explain_chart(
-        self, 
+    def _chart_messages(
+        self,
         chart_config: Dict[str, Any],
         data_context: str,
-    ) -> str:
+    ) -> List[Dict[str, str]]:
         """
-        Generate an explanation for a chart
-        
-        Args:
-            chart_config: Chart configuration
-            data_context: Context about the data
-            
-        Returns:
-            Explanation text
+        Build the conversation for `explain_chart`
         """
         
         prompt = f"""Explain this chart in simple terms:
@@ -344,7 +909,7 @@ Provide:
 2. Key takeaways
 3. Any notable patterns or insights"""
 
-        return await self.chat([
+        return [
             {"role": "system", "content": "You are a data visualization expert. Explain charts clearly for non-technical users."},
             {"role": "user", "content": prompt},
-        ])
\ No newline at end of file
+        ]
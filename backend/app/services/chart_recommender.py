@@ -3,11 +3,16 @@ Chart Recommender Service
 Automatically suggests appropriate visualizations based on data
 """
 
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 import numpy as np
 from loguru import logger
-import uuid
+import itertools
+import re
+import secrets
+
+from app.services.data_profiler import format_column_name, numeric_columns
 
 
 class ChartRecommender:
@@ -50,6 +55,15 @@ class ChartRecommender:
         },
     }
     
+    # Non-datetime columns whose names match are probed for date values
+    TIME_NAME_PATTERN = re.compile(r"date|time|year|month|day|period|week", re.IGNORECASE)
+    
+    # Points plotted in a scatter chart, spread evenly over the rows
+    SCATTER_POINTS = 200
+    
+    # Slices in a pie chart, including the "Other" slice
+    PIE_SLICES = 6
+    
     # Color palette
     COLORS = [
         "#4265FF",  # Primary blue
@@ -63,7 +77,15 @@ class ChartRecommender:
     ]
     
     def __init__(self):
-        pass
+        # Chart ids are a random per-instance prefix plus a sequence number
+        self._id_prefix = secrets.token_hex(8)
+        self._id_seq = itertools.count()
+    
+    def _chart_id(self) -> str:
+        """
+        Next chart id (a random prefix avoids collisions between instances)
+        """
+        return f"{self._id_prefix}-{next(self._id_seq)}"
     
     def recommend(
         self, 
@@ -83,53 +105,81 @@ class ChartRecommender:
             List of chart configurations
         """
         
-        logger.info(f"Recommending charts for {len(df.columns)} columns")
+        logger.opt(lazy=True).debug("Recommending charts for {} columns", lambda: len(df.columns))
         
         charts = []
         
+        # Nothing to plot: skip classification, probing and aggregation
+        if df.empty:
+            return charts
+        
         # Categorize columns
         columns = self._categorize_columns(df, profile)
         
+        # Category sums shared by the bar, distribution and top-N charts,
+        # computed once per (category, value) pair
+        totals: Dict[Tuple[str, str], Optional[pd.Series]] = {}
+        if columns["category"] and columns["numeric"]:
+            value_col = columns["numeric"][0]
+            for cat_col in {columns["category"][0], self._top_n_category(columns)}:
+                try:
+                    totals[(cat_col, value_col)] = self._category_totals(df, cat_col, value_col)
+                except Exception as e:
+                    logger.warning(f"Failed to aggregate {value_col} by {cat_col}: {e}")
+        
+        # Collect the builders that apply, in display order
+        builders = []
+        
         # 1. Time series charts (if time column exists)
         if columns["time"] and columns["numeric"]:
-            chart = self._create_time_series_chart(df, columns)
-            if chart:
-                charts.append(chart)
+            builders.append((self._create_time_series_chart, ()))
         
         # 2. Category comparison (bar chart)
         if columns["category"] and columns["numeric"]:
-            chart = self._create_category_chart(df, columns)
-            if chart:
-                charts.append(chart)
+            builders.append((self._create_category_chart, (totals,)))
         
         # 3. Distribution (pie/donut chart)
         if columns["category"] and columns["numeric"]:
-            chart = self._create_distribution_chart(df, columns)
-            if chart:
-                charts.append(chart)
+            builders.append((self._create_distribution_chart, (totals,)))
         
         # 4. Correlation (scatter plot)
         if len(columns["numeric"]) >= 2:
-            chart = self._create_scatter_chart(df, columns)
-            if chart:
-                charts.append(chart)
+            builders.append((self._create_scatter_chart, ()))
         
         # 5. Top N comparison
         if columns["category"] and columns["numeric"]:
-            chart = self._create_top_n_chart(df, columns)
-            if chart:
-                charts.append(chart)
+            builders.append((self._create_top_n_chart, (totals,)))
         
         # 6. Trend comparison (multiple lines)
         if columns["time"] and len(columns["numeric"]) >= 2:
-            chart = self._create_multi_line_chart(df, columns)
-            if chart:
-                charts.append(chart)
+            builders.append((self._create_multi_line_chart, ()))
+        
+        # Builders are independent and read-only, so run them concurrently;
+        # pandas releases the GIL in most groupby/sort kernels
+        failed = []
+        if builders:
+            with ThreadPoolExecutor(max_workers=len(builders)) as pool:
+                futures = [
+                    pool.submit(build, df, columns, *args)
+                    for build, args in builders
+                ]
+                for (build, _), future in zip(builders, futures):
+                    try:
+                        chart = future.result()
+                    except Exception as e:
+                        failed.append(f"{build.__name__.removeprefix('_create_')}: {e}")
+                        continue
+                    if chart:
+                        charts.append(chart)
+        
+        # One line for all failed builders rather than one per failure
+        if failed:
+            logger.warning(f"Skipped {len(failed)} chart(s): {'; '.join(failed)}")
         
         # Limit charts
         charts = charts[:max_charts]
         
-        logger.info(f"Recommended {len(charts)} charts")
+        logger.opt(lazy=True).info("Recommended {} charts", lambda: len(charts))
         
         return charts
     
@@ -162,19 +212,54 @@ class ChartRecommender:
             else:
                 columns["text"].append(name)
         
-        # Try to detect time columns from names
-        time_keywords = ["date", "time", "year", "month", "day", "period", "week"]
+        # Try to detect time columns from names (non-numeric columns only)
+        skip = set(numeric_columns(df)).union(columns["time"])
         for col in df.columns:
-            if col not in columns["time"]:
-                if any(kw in col.lower() for kw in time_keywords):
-                    try:
-                        pd.to_datetime(df[col].head(100), errors="raise")
-                        columns["time"].append(col)
-                    except:
-                        pass
+            if col in skip or not self.TIME_NAME_PATTERN.search(str(col)):
+                continue
+            
+            # Accept the column if every non-null sample value parses
+            sample = df[col].head(100)
+            parsed = pd.to_datetime(sample, errors="coerce")
+            if parsed.notna().sum() == sample.notna().sum():
+                columns["time"].append(col)
         
         return columns
     
+    def _category_totals(
+        self, 
+        df: pd.DataFrame, 
+        cat_col: str, 
+        value_col: str
+    ) -> pd.Series:
+        """
+        Sum a numeric column per category, largest first
+        """
+        
+        # Skip sorting group keys; the result is re-sorted by value anyway
+        totals = df.groupby(cat_col, sort=False, observed=True)[value_col].sum()
+        return totals.sort_values(ascending=False)
+    
+    def _lookup_totals(
+        self,
+        df: pd.DataFrame,
+        totals: Optional[Dict[Tuple[str, str], pd.Series]],
+        cat_col: str,
+        value_col: str
+    ) -> pd.Series:
+        """
+        Precomputed category sums from `recommend`, or compute them now
+        """
+        
+        sums = totals.get((cat_col, value_col)) if totals else None
+        return sums if sums is not None else self._category_totals(df, cat_col, value_col)
+    
+    def _top_n_category(self, columns: Dict[str, List[str]]) -> str:
+        """
+        Category for the top-N chart: the second one, or the first if only one
+        """
+        return columns["category"][1] if len(columns["category"]) > 1 else columns["category"][0]
+    
     def _create_time_series_chart(
         self, 
         df: pd.DataFrame, 
@@ -187,46 +272,47 @@ class ChartRecommender:
         time_col = columns["time"][0]
         value_col = columns["numeric"][0]
         
-        try:
-            # Prepare data
-            chart_df = df[[time_col, value_col]].dropna()
-            chart_df = chart_df.sort_values(time_col)
-            
-            # Aggregate if too many points
-            if len(chart_df) > 100:
-                chart_df[time_col] = pd.to_datetime(chart_df[time_col])
-                chart_df = chart_df.groupby(pd.Grouper(key=time_col, freq="M"))[value_col].sum().reset_index()
-            
-            # Limit data points
-            chart_df = chart_df.tail(50)
-            
-            # Format data
-            data = []
-            for _, row in chart_df.iterrows():
-                data.append({
-                    "date": str(row[time_col])[:10],
-                    "value": round(float(row[value_col]), 2) if pd.notna(row[value_col]) else 0,
-                })
-            
-            return {
-                "id": str(uuid.uuid4()),
-                "type": "area",
-                "title": f"{self._format_name(value_col)} Over Time",
-                "description": f"Trend of {self._format_name(value_col).lower()} across {self._format_name(time_col).lower()}",
-                "x_axis": {"field": "date", "label": self._format_name(time_col), "type": "time"},
-                "y_axis": {"field": "value", "label": self._format_name(value_col), "type": "value"},
-                "data": data,
-                "colors": [self.COLORS[0]],
-            }
-            
-        except Exception as e:
-            logger.warning(f"Failed to create time series chart: {e}")
-            return None
+        times = df[time_col]
+        values = df[value_col]
+        valid = times.notna() & values.notna()
+        
+        if valid.sum() > 100:
+            # Aggregate by month without copying or sorting the rows;
+            # only the month keys are sorted. Months with no rows are
+            # kept as zero and labelled by their last day, as resampling
+            # to month-end would.
+            months = pd.to_datetime(times[valid], errors="coerce").dt.to_period("M")
+            sums = values[valid].groupby(months, sort=True).sum()
+            sums = sums.reindex(
+                pd.period_range(sums.index[0], sums.index[-1], freq="M"),
+                fill_value=0,
+            ).tail(50)
+            dates = self._labels(sums.index.to_timestamp(how="end").to_series(), 10)
+            points = self._rounded(sums)
+        else:
+            chart_df = df.loc[valid, [time_col, value_col]].sort_values(time_col).tail(50)
+            dates = self._labels(chart_df[time_col], 10)
+            points = self._rounded(chart_df[value_col])
+        
+        # Format data
+        data = [{"date": date, "value": value} for date, value in zip(dates, points)]
+        
+        return {
+            "id": self._chart_id(),
+            "type": "area",
+            "title": f"{self._format_name(value_col)} Over Time",
+            "description": f"Trend of {self._format_name(value_col).lower()} across {self._format_name(time_col).lower()}",
+            "x_axis": {"field": "date", "label": self._format_name(time_col), "type": "time"},
+            "y_axis": {"field": "value", "label": self._format_name(value_col), "type": "value"},
+            "data": data,
+            "colors": [self.COLORS[0]],
+        }
     
     def _create_category_chart(
         self, 
         df: pd.DataFrame, 
-        columns: Dict[str, List[str]]
+        columns: Dict[str, List[str]],
+        totals: Optional[Dict[Tuple[str, str], pd.Series]] = None
     ) -> Optional[Dict[str, Any]]:
         """
         Create a bar chart comparing categories
@@ -235,37 +321,33 @@ class ChartRecommender:
         cat_col = columns["category"][0]
         value_col = columns["numeric"][0]
         
-        try:
-            # Aggregate by category
-            chart_df = df.groupby(cat_col)[value_col].sum().reset_index()
-            chart_df = chart_df.sort_values(value_col, ascending=False).head(10)
-            
-            data = []
-            for _, row in chart_df.iterrows():
-                data.append({
-                    "category": str(row[cat_col])[:20],
-                    "value": round(float(row[value_col]), 2),
-                })
-            
-            return {
-                "id": str(uuid.uuid4()),
-                "type": "bar",
-                "title": f"{self._format_name(value_col)} by {self._format_name(cat_col)}",
-                "description": f"Comparison of {self._format_name(value_col).lower()} across {self._format_name(cat_col).lower()}",
-                "x_axis": {"field": "category", "label": self._format_name(cat_col), "type": "category"},
-                "y_axis": {"field": "value", "label": self._format_name(value_col), "type": "value"},
-                "data": data,
-                "colors": [self.COLORS[0]],
-            }
-            
-        except Exception as e:
-            logger.warning(f"Failed to create category chart: {e}")
-            return None
+        # Aggregate by category
+        sums = self._lookup_totals(df, totals, cat_col, value_col).head(10)
+        
+        data = [
+            {"category": category, "value": value}
+            for category, value in zip(
+                self._labels(sums.index.to_series(), 20),
+                self._rounded(sums),
+            )
+        ]
+        
+        return {
+            "id": self._chart_id(),
+            "type": "bar",
+            "title": f"{self._format_name(value_col)} by {self._format_name(cat_col)}",
+            "description": f"Comparison of {self._format_name(value_col).lower()} across {self._format_name(cat_col).lower()}",
+            "x_axis": {"field": "category", "label": self._format_name(cat_col), "type": "category"},
+            "y_axis": {"field": "value", "label": self._format_name(value_col), "type": "value"},
+            "data": data,
+            "colors": [self.COLORS[0]],
+        }
     
     def _create_distribution_chart(
         self, 
         df: pd.DataFrame, 
-        columns: Dict[str, List[str]]
+        columns: Dict[str, List[str]],
+        totals: Optional[Dict[Tuple[str, str], pd.Series]] = None
     ) -> Optional[Dict[str, Any]]:
         """
         Create a pie/donut chart showing distribution
@@ -277,41 +359,45 @@ class ChartRecommender:
         if not cat_col:
             return None
         
-        try:
-            if value_col:
-                # Sum by category
-                chart_df = df.groupby(cat_col)[value_col].sum().reset_index()
+        if value_col:
+            # Sum by category
+            sums = self._lookup_totals(df, totals, cat_col, value_col)
+        else:
+            # Count by category
+            sums = df[cat_col].value_counts()
+        
+        # Keep the largest categories and fold the rest into one slice, so
+        # shares are of the whole column and the slice count stays bounded
+        if len(sums) > self.PIE_SLICES:
+            top = sums.head(self.PIE_SLICES - 1)
+            rest = sums.iloc[self.PIE_SLICES - 1:].sum()
+            if "Other" in top.index:
+                # A real "Other" category absorbs the rest rather than
+                # appearing twice under the same label
+                sums = top.copy()
+                sums.loc["Other"] += rest
             else:
-                # Count by category
-                chart_df = df[cat_col].value_counts().reset_index()
-                chart_df.columns = [cat_col, "count"]
-                value_col = "count"
-            
-            # Limit to top categories
-            chart_df = chart_df.nlargest(6, value_col)
-            total = chart_df[value_col].sum()
-            
-            data = []
-            for i, (_, row) in enumerate(chart_df.iterrows()):
-                pct = round(float(row[value_col]) / total * 100, 1) if total > 0 else 0
-                data.append({
-                    "name": str(row[cat_col])[:15],
-                    "value": pct,
-                    "color": self.COLORS[i % len(self.COLORS)],
-                })
-            
-            return {
-                "id": str(uuid.uuid4()),
-                "type": "pie",
-                "title": f"{self._format_name(cat_col)} Distribution",
-                "description": f"Breakdown by {self._format_name(cat_col).lower()}",
-                "data": data,
-                "colors": self.COLORS[:len(data)],
-            }
-            
-        except Exception as e:
-            logger.warning(f"Failed to create distribution chart: {e}")
-            return None
+                sums = pd.concat([top, pd.Series([rest], index=["Other"])])
+        
+        total = sums.sum()
+        if total > 0:
+            shares = self._rounded(sums / total * 100, 1)
+        else:
+            shares = [0] * len(sums)
+        
+        data = [
+            {"name": name, "value": pct, "color": self.COLORS[i % len(self.COLORS)]}
+            for i, (name, pct) in enumerate(zip(self._labels(sums.index.to_series(), 15), shares))
+        ]
+        
+        return {
+            "id": self._chart_id(),
+            "type": "pie",
+            "title": f"{self._format_name(cat_col)} Distribution",
+            "description": f"Breakdown by {self._format_name(cat_col).lower()}",
+            "data": data,
+            "colors": self.COLORS[:len(data)],
+        }
     
     def _create_scatter_chart(
         self, 
@@ -328,35 +414,34 @@ class ChartRecommender:
         x_col = columns["numeric"][0]
         y_col = columns["numeric"][1]
         
-        try:
-            chart_df = df[[x_col, y_col]].dropna().head(200)
-            
-            data = []
-            for _, row in chart_df.iterrows():
-                data.append({
-                    "x": round(float(row[x_col]), 2),
-                    "y": round(float(row[y_col]), 2),
-                })
-            
-            return {
-                "id": str(uuid.uuid4()),
-                "type": "scatter",
-                "title": f"{self._format_name(x_col)} vs {self._format_name(y_col)}",
-                "description": f"Correlation between {self._format_name(x_col).lower()} and {self._format_name(y_col).lower()}",
-                "x_axis": {"field": "x", "label": self._format_name(x_col), "type": "value"},
-                "y_axis": {"field": "y", "label": self._format_name(y_col), "type": "value"},
-                "data": data,
-                "colors": [self.COLORS[2]],
-            }
-            
-        except Exception as e:
-            logger.warning(f"Failed to create scatter chart: {e}")
-            return None
+        chart_df = df[[x_col, y_col]].dropna()
+        if len(chart_df) > self.SCATTER_POINTS:
+            # Evenly spaced rows cover the whole dataset; the first rows
+            # alone are often one date range, region or sort order
+            rows = np.linspace(0, len(chart_df) - 1, self.SCATTER_POINTS).astype(np.intp)
+            chart_df = chart_df.iloc[rows]
+        
+        data = [
+            {"x": x, "y": y}
+            for x, y in zip(self._rounded(chart_df[x_col]), self._rounded(chart_df[y_col]))
+        ]
+        
+        return {
+            "id": self._chart_id(),
+            "type": "scatter",
+            "title": f"{self._format_name(x_col)} vs {self._format_name(y_col)}",
+            "description": f"Correlation between {self._format_name(x_col).lower()} and {self._format_name(y_col).lower()}",
+            "x_axis": {"field": "x", "label": self._format_name(x_col), "type": "value"},
+            "y_axis": {"field": "y", "label": self._format_name(y_col), "type": "value"},
+            "data": data,
+            "colors": [self.COLORS[2]],
+        }
     
     def _create_top_n_chart(
         self, 
         df: pd.DataFrame, 
         columns: Dict[str, List[str]],
+        totals: Optional[Dict[Tuple[str, str], pd.Series]] = None,
         n: int = 5
     ) -> Optional[Dict[str, Any]]:
         """
@@ -366,34 +451,29 @@ class ChartRecommender:
         if len(columns["category"]) < 1 or len(columns["numeric"]) < 1:
             return None
         
-        # Use second category or first if only one
-        cat_col = columns["category"][1] if len(columns["category"]) > 1 else columns["category"][0]
+        cat_col = self._top_n_category(columns)
         value_col = columns["numeric"][0]
         
-        try:
-            chart_df = df.groupby(cat_col)[value_col].sum().nlargest(n).reset_index()
-            
-            data = []
-            for i, (_, row) in enumerate(chart_df.iterrows()):
-                data.append({
-                    "name": str(row[cat_col])[:25],
-                    "value": round(float(row[value_col]), 2),
-                })
-            
-            return {
-                "id": str(uuid.uuid4()),
-                "type": "bar",
-                "title": f"Top {n} {self._format_name(cat_col)}",
-                "description": f"Highest {self._format_name(value_col).lower()} by {self._format_name(cat_col).lower()}",
-                "x_axis": {"field": "name", "label": self._format_name(cat_col), "type": "category"},
-                "y_axis": {"field": "value", "label": self._format_name(value_col), "type": "value"},
-                "data": data,
-                "colors": self.COLORS[:n],
-            }
-            
-        except Exception as e:
-            logger.warning(f"Failed to create top N chart: {e}")
-            return None
+        sums = self._lookup_totals(df, totals, cat_col, value_col).head(n)
+        
+        data = [
+            {"name": name, "value": value}
+            for name, value in zip(
+                self._labels(sums.index.to_series(), 25),
+                self._rounded(sums),
+            )
+        ]
+        
+        return {
+            "id": self._chart_id(),
+            "type": "bar",
+            "title": f"Top {n} {self._format_name(cat_col)}",
+            "description": f"Highest {self._format_name(value_col).lower()} by {self._format_name(cat_col).lower()}",
+            "x_axis": {"field": "name", "label": self._format_name(cat_col), "type": "category"},
+            "y_axis": {"field": "value", "label": self._format_name(value_col), "type": "value"},
+            "data": data,
+            "colors": self.COLORS[:n],
+        }
     
     def _create_multi_line_chart(
         self, 
@@ -410,35 +490,42 @@ class ChartRecommender:
         if len(value_cols) < 2:
             return None
         
-        try:
-            chart_df = df[[time_col] + value_cols].dropna()
-            chart_df = chart_df.sort_values(time_col).tail(30)
-            
-            data = []
-            for _, row in chart_df.iterrows():
-                point = {"date": str(row[time_col])[:10]}
-                for col in value_cols:
-                    point[col] = round(float(row[col]), 2) if pd.notna(row[col]) else 0
-                data.append(point)
-            
-            return {
-                "id": str(uuid.uuid4()),
-                "type": "line",
-                "title": "Metric Comparison Over Time",
-                "description": f"Comparing {', '.join([self._format_name(c) for c in value_cols])}",
-                "x_axis": {"field": "date", "label": self._format_name(time_col), "type": "time"},
-                "y_axis": {"field": value_cols[0], "label": "Value", "type": "value"},
-                "data": data,
-                "colors": self.COLORS[:len(value_cols)],
-            }
-            
-        except Exception as e:
-            logger.warning(f"Failed to create multi-line chart: {e}")
-            return None
+        chart_df = df[[time_col] + value_cols].dropna()
+        chart_df = chart_df.sort_values(time_col).tail(30)
+        
+        dates = self._labels(chart_df[time_col], 10)
+        values = [self._rounded(chart_df[col]) for col in value_cols]
+        data = [
+            {"date": date, **dict(zip(value_cols, point))}
+            for date, *point in zip(dates, *values)
+        ]
+        
+        return {
+            "id": self._chart_id(),
+            "type": "line",
+            "title": "Metric Comparison Over Time",
+            "description": f"Comparing {', '.join([self._format_name(c) for c in value_cols])}",
+            "x_axis": {"field": "date", "label": self._format_name(time_col), "type": "time"},
+            "y_axis": {"field": value_cols[0], "label": "Value", "type": "value"},
+            "data": data,
+            "colors": self.COLORS[:len(value_cols)],
+        }
+    
+    def _labels(self, series: pd.Series, width: int) -> List[str]:
+        """
+        Values as display strings, truncated to `width` characters
+        """
+        return series.astype(str).str[:width].tolist()
+    
+    def _rounded(self, series: pd.Series, decimals: int = 2) -> List[float]:
+        """
+        Values as rounded Python floats, with missing values as 0
+        """
+        values = np.round(series.to_numpy(dtype=np.float64, na_value=np.nan), decimals)
+        return np.nan_to_num(values, nan=0.0).tolist()
     
     def _format_name(self, name: str) -> str:
         """
         Format column name for display
         """
-        formatted = name.replace("_", " ").replace("-", " ")
-        return " ".join(word.capitalize() for word in formatted.split())
\ No newline at end of file
+        return format_column_name(name)
\ No newline at end of file
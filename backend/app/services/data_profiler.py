@@ -3,14 +3,86 @@ Data Profiler Service
 Analyzes data structure, types, and statistics
 """
 
-from typing import Any, Dict, List, Optional, Union
+from typing import Any, Dict, List, Optional, Tuple, Union
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+import os
+import re
 import pandas as pd
 import numpy as np
 from loguru import logger
-from datetime import datetime
 import uuid
+import weakref
 
 from app.config import settings
+from app.core.timestamps import utc_now_iso
+
+
+# Numeric column names per live DataFrame: id(df) -> (weak ref to df, names).
+# DataFrames aren't hashable, so entries are keyed by id and removed by the
+# weak reference's callback as soon as the frame is garbage collected.
+_numeric_columns_cache: Dict[int, Tuple[weakref.ref, List[str]]] = {}
+
+
+def numeric_columns(df: pd.DataFrame) -> List[str]:
+    """
+    Names of the numeric columns in a DataFrame, computed once per frame
+
+    Frames are assumed not to change columns after parsing (cached frames
+    are read-only). The returned list is shared; don't modify it.
+    """
+    key = id(df)
+    cached = _numeric_columns_cache.get(key)
+    if cached is not None and cached[0]() is df:
+        return cached[1]
+
+    cols = df.select_dtypes(include=[np.number]).columns.tolist()
+    ref = weakref.ref(df, lambda _, key=key: _numeric_columns_cache.pop(key, None))
+    _numeric_columns_cache[key] = (ref, cols)
+    return cols
+
+
+def estimate_memory_usage(df: pd.DataFrame, sample_rows: int = 10000) -> int:
+    """
+    Approximate in-memory size of a DataFrame in bytes
+
+    Exact for fixed-width columns. Sizing text columns exactly means visiting
+    every Python string, so on frames longer than `sample_rows` it is
+    extrapolated from that many evenly spaced rows.
+    """
+    if len(df) <= sample_rows:
+        return int(df.memory_usage(deep=True).sum())
+
+    # Index first, then one entry per column
+    usage = df.memory_usage(deep=False)
+    total = int(usage.sum())
+
+    rows = np.arange(0, len(df), len(df) // sample_rows)
+    for i, dtype in enumerate(df.dtypes):
+        if dtype == object or isinstance(dtype, pd.StringDtype):
+            sample = df.iloc[:, i].take(rows)
+            per_row = sample.memory_usage(index=False, deep=True) / len(rows)
+            total += round(per_row * len(df)) - int(usage.iloc[i + 1])
+
+    return total
+
+
+# Separators shown as spaces in display names
+_NAME_SEPARATORS = str.maketrans("_-", "  ")
+
+# Lowercase-to-uppercase boundaries in camelCase names
+_CAMEL_BOUNDARY = re.compile(r"(?<=[a-z])(?=[A-Z])")
+
+
+@lru_cache(maxsize=512)
+def format_column_name(name: str) -> str:
+    """
+    Display form of a column name: separators to spaces, words capitalized
+
+    Cached because charts and insights format the same few column names
+    repeatedly.
+    """
+    return " ".join(word.capitalize() for word in name.translate(_NAME_SEPARATORS).split())
 
 
 class DataProfiler:
@@ -18,18 +90,30 @@ class DataProfiler:
     Profiles datasets to understand structure and content
     """
     
-    # Type mapping
-    DTYPE_MAP = {
-        "int64": "integer",
-        "int32": "integer",
-        "float64": "float",
-        "float32": "float",
-        "object": "string",
-        "bool": "boolean",
-        "datetime64[ns]": "datetime",
-        "category": "category",
+    # Type mapping by NumPy dtype kind, so every width (int8..uint64,
+    # float16..float64) and tz-aware datetimes resolve with one dict lookup
+    DTYPE_KIND_MAP = {
+        "i": "integer",
+        "u": "integer",
+        "f": "float",
+        "b": "boolean",
+        "M": "datetime",
+        "O": "string",
     }
     
+    # Frames at least this wide are profiled with one thread per core
+    PARALLEL_MIN_COLUMNS = 8
+    
+    # Rows read first when looking for distinct sample values
+    SAMPLE_SCAN_ROWS = 100
+    
+    # Rows of each text column measured to estimate its memory footprint
+    MEMORY_SAMPLE_ROWS = 10000
+    
+    # KPI columns whose names match are shown as currency / percentages
+    CURRENCY_NAME_PATTERN = re.compile(r"price|cost|revenue|sales|amount", re.IGNORECASE)
+    PERCENT_NAME_PATTERN = re.compile(r"percent|rate|pct|%", re.IGNORECASE)
+    
     def __init__(self, sample_size: int = 5):
         """
         Initialize profiler
@@ -53,48 +137,110 @@ class DataProfiler:
         profile = {
             "row_count": len(df),
             "column_count": len(df.columns),
-            "memory_usage": df.memory_usage(deep=True).sum(),
+            "memory_usage": self._memory_usage(df),
             "columns": [],
             "correlations": None,
-            "created_at": datetime.utcnow().isoformat(),
+            "created_at": utc_now_iso(),
         }
         
-        # Profile each column
-        for col in df.columns:
-            col_profile = self._profile_column(df[col], col)
-            profile["columns"].append(col_profile)
-        
-        # Calculate correlations for numeric columns
-        numeric_cols = df.select_dtypes(include=[np.number]).columns
-        if len(numeric_cols) >= 2:
-            try:
-                corr_matrix = df[numeric_cols].corr()
-                profile["correlations"] = self._get_top_correlations(corr_matrix)
-            except Exception as e:
-                logger.warning(f"Correlation calculation failed: {e}")
+        # Null and distinct counts for every column in one pass each
+        missing = df.isna().sum()
+        unique = df.nunique()
+        
+        # Profile each column; columns are independent, so wide frames are
+        # spread over threads (pandas releases the GIL in most reductions)
+        def profile_column(col):
+            return self._profile_column(
+                df[col], col, missing=int(missing[col]), unique=int(unique[col])
+            )
+        
+        workers = min(len(df.columns), os.cpu_count() or 1)
+        if workers > 1 and len(df.columns) >= self.PARALLEL_MIN_COLUMNS:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                # The correlation matrix is the largest single task, so it
+                # starts first and overlaps with the column profiles
+                correlations = pool.submit(self._correlations, df, missing)
+                profile["columns"] = list(pool.map(profile_column, df.columns))
+                profile["correlations"] = correlations.result()
+        else:
+            profile["columns"] = [profile_column(col) for col in df.columns]
+            profile["correlations"] = self._correlations(df, missing)
         
         return profile
     
-    def _profile_column(self, series: pd.Series, name: str) -> Dict[str, Any]:
+    def _correlations(
+        self,
+        df: pd.DataFrame,
+        missing: pd.Series,
+    ) -> Optional[List[Dict[str, Any]]]:
+        """
+        Strongest pairwise correlations between numeric columns
+        
+        Args:
+            df: Full DataFrame
+            missing: Null count per column
+        """
+        
+        numeric_cols = numeric_columns(df)
+        if len(numeric_cols) < 2:
+            return None
+        
+        try:
+            corr_matrix = self._correlation_matrix(
+                df[numeric_cols], has_missing=bool(missing[numeric_cols].any())
+            )
+            return self._get_top_correlations(corr_matrix)
+        except Exception as e:
+            logger.warning(f"Correlation calculation failed: {e}")
+            return None
+    
+    def _memory_usage(self, df: pd.DataFrame) -> int:
+        """
+        Approximate in-memory size of a DataFrame in bytes (exact when
+        DEEP_MEMORY_PROFILING is set)
+        """
+        
+        if settings.DEEP_MEMORY_PROFILING:
+            return int(df.memory_usage(deep=True).sum())
+        return estimate_memory_usage(df, self.MEMORY_SAMPLE_ROWS)
+    
+    def _profile_column(
+        self, 
+        series: pd.Series, 
+        name: str,
+        missing: Optional[int] = None,
+        unique: Optional[int] = None,
+    ) -> Dict[str, Any]:
         """
         Profile a single column
+        
+        Args:
+            series: Column values
+            name: Column name
+            missing: Precomputed null count (computed here if omitted)
+            unique: Precomputed distinct count (computed here if omitted)
         """
         
+        if missing is None:
+            missing = int(series.isna().sum())
+        if unique is None:
+            unique = series.nunique()
+        
         # Basic info
         col_profile = {
             "name": name,
-            "type": self._detect_type(series),
+            "type": self._detect_type(series, unique),
             "dtype": str(series.dtype),
-            "nullable": series.isna().any(),
-            "unique": series.nunique(),
-            "missing": int(series.isna().sum()),
-            "missing_pct": round(series.isna().sum() / len(series) * 100, 2),
-            "sample": self._get_sample(series),
+            "nullable": missing > 0,
+            "unique": unique,
+            "missing": missing,
+            "missing_pct": round(missing / len(series) * 100, 2),
+            "sample": self._get_sample(series, unique),
         }
         
         # Type-specific stats
         if col_profile["type"] in ["integer", "float"]:
-            col_profile["stats"] = self._numeric_stats(series)
+            col_profile["stats"] = self._numeric_stats(series, missing)
         elif col_profile["type"] == "datetime":
             col_profile["stats"] = self._datetime_stats(series)
         elif col_profile["type"] in ["string", "category"]:
@@ -102,19 +248,21 @@ class DataProfiler:
         
         return col_profile
     
-    def _detect_type(self, series: pd.Series) -> str:
+    def _detect_type(self, series: pd.Series, unique: Optional[int] = None) -> str:
         """
         Detect the semantic type of a column
         """
         
-        dtype = str(series.dtype)
+        dtype = series.dtype
         
         # Check dtype mapping
-        if dtype in self.DTYPE_MAP:
-            return self.DTYPE_MAP[dtype]
+        if isinstance(dtype, pd.CategoricalDtype):
+            return "category"
+        if dtype.kind in self.DTYPE_KIND_MAP:
+            return self.DTYPE_KIND_MAP[dtype.kind]
         
         # For object types, try to infer
-        if dtype == "object":
+        if dtype == object:
             # Sample non-null values
             sample = series.dropna().head(100)
             
@@ -136,29 +284,34 @@ class DataProfiler:
                 pass
             
             # Check if categorical (low cardinality)
-            if series.nunique() < len(series) * 0.5 and series.nunique() < 50:
+            if unique is None:
+                unique = series.nunique()
+            if unique < len(series) * 0.5 and unique < 50:
                 return "category"
             
             return "string"
         
         return "string"
     
-    def _get_sample(self, series: pd.Series) -> List[Any]:
+    def _get_sample(self, series: pd.Series, unique: Optional[int] = None) -> List[Any]:
         """
         Get sample values from a column
-        """
         
-        # Get non-null values
-        non_null = series.dropna()
-        
-        if len(non_null) == 0:
-            return []
+        Distinct values are taken in first-seen order, so they can be read
+        from a prefix of the column that grows until it holds enough of
+        them (or all `unique` of them), instead of hashing every row.
+        """
         
-        # Get unique sample
-        sample = non_null.drop_duplicates().head(self.sample_size).tolist()
+        rows = self.SAMPLE_SCAN_ROWS
+        while True:
+            # Get unique non-null values from the first rows
+            sample = series.iloc[:rows].dropna().drop_duplicates().head(self.sample_size)
+            if len(sample) == self.sample_size or len(sample) == unique or rows >= len(series):
+                break
+            rows *= 4
         
         # Convert numpy types to Python types
-        return [self._to_python_type(v) for v in sample]
+        return [self._to_python_type(v) for v in sample.tolist()]
     
     def _to_python_type(self, value: Any) -> Any:
         """
@@ -177,12 +330,17 @@ class DataProfiler:
             return str(value)
         return str(value)
     
-    def _numeric_stats(self, series: pd.Series) -> Dict[str, Any]:
+    def _numeric_stats(self, series: pd.Series, missing: Optional[int] = None) -> Dict[str, Any]:
         """
         Calculate statistics for numeric columns
+        
+        Args:
+            series: Column values
+            missing: Known null count; a column with none is used as-is
+                instead of copied through dropna()
         """
         
-        clean = series.dropna()
+        clean = series if missing == 0 else series.dropna()
         
         if len(clean) == 0:
             return {}
@@ -204,16 +362,19 @@ class DataProfiler:
         """
         
         try:
-            dt_series = pd.to_datetime(series, errors="coerce")
-            clean = dt_series.dropna()
+            # Columns typed as datetime need no conversion or null-free copy;
+            # min/max skip NaT on their own
+            if not pd.api.types.is_datetime64_any_dtype(series):
+                series = pd.to_datetime(series, errors="coerce")
             
-            if len(clean) == 0:
+            start, end = series.min(), series.max()
+            if pd.isna(start):
                 return {}
             
             return {
-                "min": str(clean.min()),
-                "max": str(clean.max()),
-                "range_days": (clean.max() - clean.min()).days,
+                "min": str(start),
+                "max": str(end),
+                "range_days": (end - start).days,
             }
         except Exception as e:
             logger.warning(f"Datetime stats failed: {e}")
@@ -224,16 +385,47 @@ class DataProfiler:
         Calculate statistics for categorical columns
         """
         
-        value_counts = series.value_counts().head(10)
+        counts = series.value_counts()
+        
+        # The most common value comes first; only a tie for first place needs
+        # mode(), which reports the smallest of the tied values
+        mode = None
+        if len(counts) > 0 and counts.iloc[0] > 0:
+            if len(counts) == 1 or counts.iloc[1] < counts.iloc[0]:
+                mode = str(counts.index[0])
+            else:
+                mode = str(series.mode().iloc[0])
         
         return {
-            "mode": str(series.mode().iloc[0]) if len(series.mode()) > 0 else None,
+            "mode": mode,
             "top_values": [
                 {"value": str(k), "count": int(v)}
-                for k, v in value_counts.items()
+                for k, v in counts.head(10).items()
             ],
         }
     
+    def _correlation_matrix(self, df: pd.DataFrame, has_missing: bool) -> pd.DataFrame:
+        """
+        Pearson correlation matrix of an all-numeric DataFrame
+        
+        Without nulls this is a single np.corrcoef over the stacked values,
+        in PROFILE_PRECISION. Columns with nulls need pandas' pairwise
+        deletion, so those frames still go through DataFrame.corr().
+        """
+        
+        if has_missing:
+            return df.corr()
+        
+        # Whatever layout pandas hands back is used as-is: corrcoef is no
+        # faster on a C-ordered copy, and making one costs a full pass
+        dtype = np.dtype(settings.PROFILE_PRECISION)
+        values = df.to_numpy(dtype=dtype)
+        # Constant columns divide by a zero std; pandas reports those as NaN too
+        with np.errstate(divide="ignore", invalid="ignore"):
+            matrix = np.corrcoef(values, rowvar=False, dtype=dtype)
+        
+        return pd.DataFrame(matrix, index=df.columns, columns=df.columns)
+    
     def _get_top_correlations(
         self, 
         corr_matrix: pd.DataFrame, 
@@ -243,26 +435,34 @@ class DataProfiler:
         Get top correlations from correlation matrix
         """
         
-        # Get upper triangle indices
-        correlations = []
-        
-        for i in range(len(corr_matrix.columns)):
-            for j in range(i + 1, len(corr_matrix.columns)):
-                col1 = corr_matrix.columns[i]
-                col2 = corr_matrix.columns[j]
-                corr = corr_matrix.iloc[i, j]
-                
-                if not np.isnan(corr):
-                    correlations.append({
-                        "column1": col1,
-                        "column2": col2,
-                        "correlation": round(float(corr), 3),
-                    })
-        
-        # Sort by absolute correlation
-        correlations.sort(key=lambda x: abs(x["correlation"]), reverse=True)
-        
-        return correlations[:n]
+        # Upper triangle without the diagonal, in row-major order
+        matrix = corr_matrix.to_numpy()
+        rows, cols = np.triu_indices(len(matrix), k=1)
+        values = matrix[rows, cols]
+        
+        keep = ~np.isnan(values)
+        rows, cols, values = rows[keep], cols[keep], values[keep]
+        
+        # Largest absolute (rounded) correlations first; a stable sort keeps
+        # ties in matrix order. Only the pairs that can make the top n are
+        # sorted at all.
+        strength = np.abs(np.round(values, 3))
+        if len(strength) > n:
+            cutoff = np.partition(strength, len(strength) - n)[len(strength) - n]
+            candidates = np.flatnonzero(strength >= cutoff)
+        else:
+            candidates = np.arange(len(strength))
+        top = candidates[np.argsort(-strength[candidates], kind="stable")][:n]
+        
+        names = corr_matrix.columns
+        return [
+            {
+                "column1": names[rows[k]],
+                "column2": names[cols[k]],
+                "correlation": round(float(values[k]), 3),
+            }
+            for k in top
+        ]
     
     def generate_kpis(self, df: pd.DataFrame) -> List[Dict[str, Any]]:
         """
@@ -272,47 +472,71 @@ class DataProfiler:
         kpis = []
         
         # Find numeric columns
-        numeric_cols = df.select_dtypes(include=[np.number]).columns
+        numeric_cols = numeric_columns(df)[:4]  # Max 4 KPIs
         
-        for i, col in enumerate(numeric_cols[:4]):  # Max 4 KPIs
-            series = df[col].dropna()
-            
-            if len(series) == 0:
+        if len(numeric_cols) == 0:
+            return kpis
+        
+        # One vectorized reduction for every KPI column
+        stats = df[numeric_cols].agg(["count", "sum", "mean"])
+        
+        for col in numeric_cols:
+            if stats.at["count", col] == 0:
                 continue
             
             kpi = {
                 "id": str(uuid.uuid4()),
                 "label": self._format_column_name(col),
-                "value": round(float(series.sum()), 2),
+                "value": round(float(stats.at["sum", col]), 2),
                 "format": "number",
-                "change": round(np.random.uniform(-20, 30), 1),  # Simulated
-                "trend": "up" if np.random.random() > 0.3 else "down",
             }
             
             # Detect if currency-like
-            if any(word in col.lower() for word in ["price", "cost", "revenue", "sales", "amount"]):
+            if self.CURRENCY_NAME_PATTERN.search(col):
                 kpi["format"] = "currency"
-            elif any(word in col.lower() for word in ["percent", "rate", "pct", "%"]):
+            elif self.PERCENT_NAME_PATTERN.search(col):
                 kpi["format"] = "percent"
-                kpi["value"] = round(float(series.mean()), 1)
+                kpi["value"] = round(float(stats.at["mean", col]), 1)
+            
+            kpi["change"] = self._half_over_half_change(
+                df[col].to_numpy(dtype=np.float64, na_value=np.nan),
+                use_mean=kpi["format"] == "percent",
+            )
+            kpi["trend"] = "up" if kpi["change"] >= 0 else "down"
             
             kpis.append(kpi)
         
         return kpis
     
-    def _format_column_name(self, name: str) -> str:
+    def _half_over_half_change(self, values: np.ndarray, use_mean: bool) -> float:
         """
-        Format column name for display
+        Percent change of the second half of the rows over the first half
+        
+        Rows are compared in file order, the nearest thing to a previous
+        period without knowing which column (if any) holds time. Totals are
+        compared for summed KPIs, averages for percentage KPIs.
         """
         
-        # Replace underscores and camelCase
-        formatted = name.replace("_", " ")
+        half = len(values) // 2
+        present = ~np.isnan(values)
+        filled = np.where(present, values, 0.0)
+        before, after = filled[:half].sum(), filled[half:].sum()
+        
+        if use_mean:
+            n_before, n_after = present[:half].sum(), present[half:].sum()
+            if n_before == 0 or n_after == 0:
+                return 0.0
+            before, after = before / n_before, after / n_after
+        
+        if before == 0:
+            return 0.0
         
-        # Add spaces before capital letters
-        result = ""
-        for i, char in enumerate(formatted):
-            if char.isupper() and i > 0 and formatted[i-1].islower():
-                result += " "
-            result += char
+        return round(float((after - before) / abs(before) * 100), 1)
+    
+    def _format_column_name(self, name: str) -> str:
+        """
+        Format column name for display
+        """
         
-        return result.title()
\ No newline at end of file
+        # Replace underscores and split camelCase
+        return _CAMEL_BOUNDARY.sub(" ", name.replace("_", " ")).title()
\ No newline at end of file
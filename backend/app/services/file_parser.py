@@ -0,0 +1,349 @@
+"""
+File Parser Service
+Reads uploaded CSV and Excel files into DataFrames
+"""
+
+from typing import Any, List, Optional
+from datetime import date, timedelta
+from itertools import islice
+import os
+import threading
+import pandas as pd
+from pandas._libs.parsers import STR_NA_VALUES
+from cachetools import LRUCache
+from loguru import logger
+
+from app.config import settings
+from app.core.exceptions import InvalidFileError
+from app.services.data_profiler import estimate_memory_usage
+
+
+# ===========================================
+# Parsed DataFrame cache (per worker process)
+# ===========================================
+# Keyed by (file_path, mtime_ns) so a replaced file is never served stale.
+# Cached frames are shared between requests and must be treated as read-only.
+# Sizes of text columns are estimated from a sample rather than measured.
+_df_cache: LRUCache = LRUCache(
+    maxsize=settings.DATAFRAME_CACHE_BYTES,
+    getsizeof=lambda df: estimate_memory_usage(df) or 1,
+)
+_df_cache_lock = threading.Lock()
+
+
+def _mangle_column_names(names: List[str]) -> List[str]:
+    """
+    Rename blank and duplicate headers the way pd.read_csv does
+    ("Unnamed: 0", "name", "name.1", ...)
+    """
+
+    names = [name or f"Unnamed: {i}" for i, name in enumerate(names)]
+    counts: dict = {}
+
+    for i, original in enumerate(names):
+        name = original
+        count = counts.get(name, 0)
+        while count > 0:
+            counts[original] = count + 1
+            name = f"{original}.{count}"
+            # Skip suffixes that are already taken by another header
+            count = count + 1 if name in names else counts.get(name, 0)
+        names[i] = name
+        counts[name] = count + 1
+
+    return names
+
+
+def _convert_excel_cell(value: Any) -> Any:
+    """
+    Normalize a calamine cell the way pandas' calamine engine does
+    """
+    if isinstance(value, float):
+        as_int = int(value)
+        return as_int if as_int == value else value
+    if isinstance(value, date):
+        return pd.Timestamp(value)
+    if isinstance(value, timedelta):
+        return pd.Timedelta(value)
+    return value
+
+
+class FileParser:
+    """
+    Parses uploaded files into pandas DataFrames
+    """
+
+    CSV_EXTENSIONS: List[str] = [".csv"]
+    EXCEL_EXTENSIONS: List[str] = [".xlsx", ".xls"]
+
+    # Bytes handed to each pyarrow reader thread: aim for a few blocks per
+    # core, within these bounds
+    CSV_MIN_BLOCK_SIZE = 1 << 20
+    CSV_MAX_BLOCK_SIZE = 8 << 20
+    CSV_BLOCKS_PER_CPU = 4
+    
+    # Rows converted per batch when reading Excel sheets
+    EXCEL_BATCH_ROWS = 65536
+    
+    # Typed, compressed copy written next to each parsed upload, plus a
+    # small one holding only the first rows for previews
+    SNAPSHOT_SUFFIX = ".parquet"
+    PREVIEW_SUFFIX = ".preview.parquet"
+    SNAPSHOT_COMPRESSION = "zstd"
+    
+    @classmethod
+    def snapshot_path(cls, file_path: str) -> str:
+        """
+        Path of the Parquet snapshot for an uploaded file
+        """
+        return file_path + cls.SNAPSHOT_SUFFIX
+    
+    @classmethod
+    def preview_path(cls, file_path: str) -> str:
+        """
+        Path of the Parquet preview (head rows) for an uploaded file
+        """
+        return file_path + cls.PREVIEW_SUFFIX
+    
+    @classmethod
+    def sidecar_paths(cls, file_path: str) -> List[str]:
+        """
+        Every derived file that may exist next to an upload
+        """
+        return [cls.snapshot_path(file_path), cls.preview_path(file_path)]
+
+    def load(self, file_path: str) -> pd.DataFrame:
+        """
+        Parse a file, reusing a previously parsed DataFrame when possible
+
+        Args:
+            file_path: Path to a CSV or Excel file
+
+        Returns:
+            Parsed DataFrame (shared, do not mutate)
+        """
+
+        key = (file_path, os.stat(file_path).st_mtime_ns)
+
+        with _df_cache_lock:
+            df = _df_cache.get(key)
+        if df is not None:
+            return df
+
+        df = self._read_snapshot(file_path)
+        if df is None:
+            df = self.parse(file_path)
+            self.write_snapshot(file_path, df)
+
+        with _df_cache_lock:
+            try:
+                _df_cache[key] = df
+            except ValueError:
+                # Larger than the whole cache budget
+                logger.debug(f"DataFrame for {file_path} too large to cache")
+
+        return df
+
+    def parse(self, file_path: str) -> pd.DataFrame:
+        """
+        Parse a file into a DataFrame
+
+        Args:
+            file_path: Path to a CSV or Excel file
+
+        Returns:
+            Parsed DataFrame
+        """
+
+        ext = os.path.splitext(file_path)[1].lower()
+
+        if ext in self.CSV_EXTENSIONS:
+            return self._parse_csv(file_path)
+        if ext in self.EXCEL_EXTENSIONS:
+            return self._parse_excel(file_path)
+
+        raise InvalidFileError(
+            detail=f"Unsupported file type: {ext}",
+            filename=os.path.basename(file_path),
+            reason="invalid_extension",
+        )
+
+    def _parse_csv(self, file_path: str) -> pd.DataFrame:
+        """
+        Parse a CSV file with the multi-threaded pyarrow reader
+        """
+
+        try:
+            import pyarrow as pa
+            import pyarrow.csv as pacsv
+        except ImportError:
+            logger.warning("pyarrow not installed, falling back to pandas CSV reader")
+            return pd.read_csv(file_path)
+
+        try:
+            table = pacsv.read_csv(
+                file_path,
+                read_options=pacsv.ReadOptions(
+                    use_threads=True,
+                    block_size=self._csv_block_size(file_path),
+                ),
+                # Treat the same tokens as missing that pd.read_csv does,
+                # in text columns too
+                convert_options=pacsv.ConvertOptions(
+                    null_values=sorted(STR_NA_VALUES),
+                    strings_can_be_null=True,
+                    quoted_strings_can_be_null=True,
+                ),
+            )
+            table = table.rename_columns(_mangle_column_names(table.column_names))
+
+            # Keep NumPy-backed dtypes (and ns timestamps) so the profiler and
+            # chart recommender see the same dtypes pandas would have produced
+            return table.to_pandas(
+                date_as_object=False,
+                coerce_temporal_nanoseconds=True,
+                split_blocks=True,
+                self_destruct=True,
+            )
+        except (pa.ArrowInvalid, ValueError) as e:
+            # Column types are inferred from the first block, so a column that
+            # changes type further down can't be converted; let pandas retry
+            logger.warning(f"pyarrow CSV parse failed ({e}), retrying with pandas")
+            return pd.read_csv(file_path)
+
+    def _csv_block_size(self, file_path: str) -> int:
+        """
+        Pick a reader block size that keeps every core busy on small files
+        without paying per-block overhead thousands of times on large ones
+        """
+
+        target = os.path.getsize(file_path) // ((os.cpu_count() or 1) * self.CSV_BLOCKS_PER_CPU)
+        return max(self.CSV_MIN_BLOCK_SIZE, min(self.CSV_MAX_BLOCK_SIZE, target))
+
+    def _parse_excel(self, file_path: str) -> pd.DataFrame:
+        """
+        Parse the first sheet of an Excel workbook with the native calamine reader
+        """
+
+        try:
+            import python_calamine  # noqa: F401
+        except ImportError:
+            logger.warning("python-calamine not installed, falling back to openpyxl/xlrd")
+            return pd.read_excel(file_path)
+
+        try:
+            return self._parse_excel_batches(file_path)
+        except Exception as e:
+            logger.warning(f"Batched Excel parse failed ({e}), retrying with pandas")
+            return pd.read_excel(file_path, engine="calamine")
+
+    def _parse_excel_batches(self, file_path: str) -> pd.DataFrame:
+        """
+        Convert the first sheet EXCEL_BATCH_ROWS rows at a time
+
+        pd.read_excel turns every cell of the sheet into a Python object before
+        building any columns. Feeding calamine's row iterator through pandas'
+        TextParser (what read_excel uses internally) in fixed-size batches keeps
+        only one batch of Python objects alive at once.
+        """
+
+        from python_calamine import CalamineWorkbook
+        from pandas.io.parsers import TextParser
+
+        sheet = CalamineWorkbook.from_path(file_path).get_sheet_by_index(0)
+        rows = sheet.iter_rows()
+
+        # iter_rows() omits empty leading columns that read_excel keeps
+        # (as "Unnamed: N"); pad them back so both give the same frame
+        lead = [""] * sheet.start[1] if sheet.start and sheet.start[1] else []
+
+        frames: List[pd.DataFrame] = []
+        columns = None
+
+        while True:
+            batch = [
+                lead + [_convert_excel_cell(cell) for cell in row]
+                for row in islice(rows, self.EXCEL_BATCH_ROWS)
+            ]
+            if not batch:
+                break
+
+            if columns is None:
+                # First batch carries the header row
+                frame = TextParser(batch, header=0, skip_blank_lines=False).read()
+                columns = frame.columns
+            else:
+                frame = TextParser(
+                    batch, header=None, names=columns, skip_blank_lines=False
+                ).read()
+            frames.append(frame)
+
+        if not frames:
+            return pd.DataFrame()
+        if len(frames) == 1:
+            return frames[0]
+        return pd.concat(frames, ignore_index=True)
+
+    def write_snapshot(self, file_path: str, df: pd.DataFrame) -> None:
+        """
+        Save a parsed DataFrame as Parquet so later loads skip re-parsing
+
+        Failures are logged and ignored; the source file stays authoritative.
+        """
+        self._write_parquet(df, self.snapshot_path(file_path), file_path)
+
+    def write_preview(self, file_path: str, df: pd.DataFrame, rows: int) -> None:
+        """
+        Save the first rows of a parsed DataFrame for cheap previews
+        """
+        self._write_parquet(df.head(rows), self.preview_path(file_path), file_path)
+
+    def read_preview(self, file_path: str) -> Optional[pd.DataFrame]:
+        """
+        Read the preview rows written by `write_preview`, if still current
+        """
+        return self._read_parquet(self.preview_path(file_path), file_path)
+
+    def _read_snapshot(self, file_path: str) -> Optional[pd.DataFrame]:
+        """
+        Read the Parquet snapshot if it exists and is newer than the source
+        """
+        return self._read_parquet(self.snapshot_path(file_path), file_path)
+
+    def _write_parquet(self, df: pd.DataFrame, path: str, file_path: str) -> None:
+        """
+        Atomically write a DataFrame to a Parquet sidecar of `file_path`
+        """
+
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+
+        try:
+            df.to_parquet(
+                tmp_path,
+                engine="pyarrow",
+                compression=self.SNAPSHOT_COMPRESSION,
+                index=False,
+            )
+            os.replace(tmp_path, path)
+        except Exception as e:
+            # Mixed-type object columns, non-string headers, no pyarrow, ...
+            logger.debug(f"Skipping Parquet sidecar for {file_path}: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+    def _read_parquet(self, path: str, file_path: str) -> Optional[pd.DataFrame]:
+        """
+        Read a Parquet sidecar if it exists and is newer than `file_path`
+        """
+
+        try:
+            if os.stat(path).st_mtime_ns < os.stat(file_path).st_mtime_ns:
+                return None
+            return pd.read_parquet(path, engine="pyarrow")
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable Parquet sidecar {path}: {e}")
+            return None
@@ -7,10 +7,12 @@ from typing import Any, Dict, List, Optional
 import pandas as pd
 import numpy as np
 from loguru import logger
+import orjson
 import uuid
 from datetime import datetime
 
 from app.services.ai_service import AIService
+from app.services.data_profiler import format_column_name
 from app.config import settings
 
 
@@ -19,6 +21,10 @@ class InsightGenerator:
     Generates insights from data using AI and statistical analysis
     """
     
+    # Numeric columns examined by the trend and anomaly checks
+    TREND_COLUMNS = 2
+    ANOMALY_COLUMNS = 3
+    
     def __init__(self):
         self.ai_service = AIService()
     
@@ -42,16 +48,22 @@ class InsightGenerator:
         
         insights = []
         
+        # Column roles and numeric values shared by the generators below
+        columns = self._columns_by_type(profile)
+        values = self._numeric_values(
+            df, columns["numeric"][:max(self.TREND_COLUMNS, self.ANOMALY_COLUMNS)]
+        )
+        
         # 1. Statistical insights (always generated)
-        stat_insights = self._generate_statistical_insights(df, profile)
+        stat_insights = self._generate_statistical_insights(df, profile, columns)
         insights.extend(stat_insights)
         
         # 2. Trend insights
-        trend_insights = self._generate_trend_insights(df, profile)
+        trend_insights = self._generate_trend_insights(df, columns, values)
         insights.extend(trend_insights)
         
         # 3. Anomaly detection
-        anomaly_insights = self._detect_anomalies(df, profile)
+        anomaly_insights = self._detect_anomalies(columns, values)
         insights.extend(anomaly_insights)
         
         # 4. Correlation insights
@@ -73,10 +85,44 @@ class InsightGenerator:
         # Limit total insights
         return insights[:10]
     
+    def _columns_by_type(self, profile: Dict[str, Any]) -> Dict[str, List[str]]:
+        """
+        Group profiled column names by role, in profile order
+        """
+        
+        columns = {"numeric": [], "time": [], "category": []}
+        for col_info in profile["columns"]:
+            if col_info["type"] in ["integer", "float"]:
+                columns["numeric"].append(col_info["name"])
+            elif col_info["type"] == "datetime":
+                columns["time"].append(col_info["name"])
+            elif col_info["type"] in ["string", "category"]:
+                columns["category"].append(col_info["name"])
+        
+        return columns
+    
+    def _numeric_values(self, df: pd.DataFrame, names: List[str]) -> Dict[str, np.ndarray]:
+        """
+        Extract numeric columns once as float64 arrays (NaN for missing)
+        
+        Rows stay aligned with `df`; each consumer drops NaNs itself.
+        Columns that can't be converted are left out.
+        """
+        
+        values = {}
+        for name in names:
+            try:
+                values[name] = df[name].to_numpy(dtype=np.float64, na_value=np.nan)
+            except Exception as e:
+                logger.debug(f"Could not read {name} as numbers: {e}")
+        
+        return values
+    
     def _generate_statistical_insights(
         self, 
         df: pd.DataFrame, 
-        profile: Dict[str, Any]
+        profile: Dict[str, Any],
+        columns: Dict[str, List[str]],
     ) -> List[Dict[str, Any]]:
         """
         Generate basic statistical insights
@@ -90,8 +136,8 @@ class InsightGenerator:
             "type": "summary",
             "title": "Dataset Overview",
             "description": f"Your dataset contains {profile['row_count']:,} records across {profile['column_count']} columns. "
-                          f"The data includes {len([c for c in profile['columns'] if c['type'] in ['integer', 'float']])} numeric "
-                          f"and {len([c for c in profile['columns'] if c['type'] in ['string', 'category']])} categorical fields.",
+                          f"The data includes {len(columns['numeric'])} numeric "
+                          f"and {len(columns['category'])} categorical fields.",
             "importance": "medium",
             "related_columns": [],
         })
@@ -102,12 +148,12 @@ class InsightGenerator:
                 col_name = col_info["name"]
                 
                 # Find a numeric column to aggregate
-                numeric_cols = [c["name"] for c in profile["columns"] if c["type"] in ["integer", "float"]]
-                if numeric_cols:
-                    num_col = numeric_cols[0]
+                if columns["numeric"]:
+                    num_col = columns["numeric"][0]
                     try:
-                        top = df.groupby(col_name)[num_col].sum().idxmax()
-                        value = df.groupby(col_name)[num_col].sum().max()
+                        totals = df.groupby(col_name, observed=True)[num_col].sum()
+                        top = totals.idxmax()
+                        value = totals.max()
                         total = df[num_col].sum()
                         pct = (value / total * 100) if total > 0 else 0
                         
@@ -127,12 +173,17 @@ class InsightGenerator:
                         logger.debug(f"Could not generate top category insight: {e}")
         
         # Missing data insight
-        total_missing = sum(c["missing"] for c in profile["columns"])
+        missing = np.fromiter(
+            (c["missing"] for c in profile["columns"]),
+            dtype=np.int64,
+            count=len(profile["columns"]),
+        )
+        total_missing = int(missing.sum())
         if total_missing > 0:
             total_cells = profile["row_count"] * profile["column_count"]
             missing_pct = (total_missing / total_cells * 100) if total_cells > 0 else 0
             
-            most_missing = max(profile["columns"], key=lambda x: x["missing"])
+            most_missing = profile["columns"][int(missing.argmax())]
             
             if missing_pct > 5:
                 insights.append({
@@ -150,7 +201,8 @@ class InsightGenerator:
     def _generate_trend_insights(
         self, 
         df: pd.DataFrame, 
-        profile: Dict[str, Any]
+        columns: Dict[str, List[str]],
+        values: Dict[str, np.ndarray],
     ) -> List[Dict[str, Any]]:
         """
         Generate trend-related insights
@@ -158,31 +210,36 @@ class InsightGenerator:
         
         insights = []
         
-        # Find time columns
-        time_cols = [c["name"] for c in profile["columns"] if c["type"] == "datetime"]
-        numeric_cols = [c["name"] for c in profile["columns"] if c["type"] in ["integer", "float"]]
-        
-        if not time_cols or not numeric_cols:
+        numeric_cols = [c for c in columns["numeric"][:self.TREND_COLUMNS] if c in values]
+        if not columns["time"] or not numeric_cols:
             return insights
         
-        time_col = time_cols[0]
+        time_col = columns["time"][0]
         
-        for num_col in numeric_cols[:2]:  # Analyze top 2 numeric columns
+        # Parse and sort the time column once for every numeric column; rows
+        # with equal timestamps keep their original order
+        try:
+            times = pd.to_datetime(df[time_col], errors="coerce")
+            valid = times.notna().to_numpy()
+            order = np.flatnonzero(valid)[times[valid].argsort(kind="stable").to_numpy()]
+        except Exception as e:
+            logger.debug(f"Trend analysis failed for {time_col}: {e}")
+            return insights
+        
+        for num_col in numeric_cols:
             try:
-                # Convert to datetime and sort
-                temp_df = df[[time_col, num_col]].dropna()
-                temp_df[time_col] = pd.to_datetime(temp_df[time_col], errors="coerce")
-                temp_df = temp_df.dropna().sort_values(time_col)
+                y = values[num_col][order]
+                y = y[~np.isnan(y)]
                 
-                if len(temp_df) < 10:
+                if len(y) < 10:
                     continue
                 
-                # Calculate trend (simple linear regression slope)
-                x = np.arange(len(temp_df))
-                y = temp_df[num_col].values
+                # Calculate trend (closed-form least-squares slope)
+                x = np.arange(len(y), dtype=np.float64)
+                x -= x.mean()
+                mean_val = y.mean()
                 
-                slope = np.polyfit(x, y, 1)[0]
-                mean_val = np.mean(y)
+                slope = x @ (y - mean_val) / (x @ x)
                 pct_change = (slope * len(x) / mean_val * 100) if mean_val != 0 else 0
                 
                 trend_direction = "increasing" if slope > 0 else "decreasing"
@@ -206,34 +263,35 @@ class InsightGenerator:
     
     def _detect_anomalies(
         self, 
-        df: pd.DataFrame, 
-        profile: Dict[str, Any]
+        columns: Dict[str, List[str]],
+        values: Dict[str, np.ndarray],
     ) -> List[Dict[str, Any]]:
         """
         Detect anomalies in the data
         """
         
         insights = []
-        numeric_cols = [c["name"] for c in profile["columns"] if c["type"] in ["integer", "float"]]
+        numeric_cols = [c for c in columns["numeric"][:self.ANOMALY_COLUMNS] if c in values]
         
-        for col_name in numeric_cols[:3]:
+        for col_name in numeric_cols:
             try:
-                series = df[col_name].dropna()
+                column = values[col_name]
+                column = column[~np.isnan(column)]
                 
-                if len(series) < 20:
+                if len(column) < 20:
                     continue
                 
-                mean = series.mean()
-                std = series.std()
+                mean = column.mean()
+                std = column.std(ddof=1)
                 
                 if std == 0:
                     continue
                 
                 # Find outliers (beyond 3 standard deviations)
-                outliers = series[(series < mean - 3*std) | (series > mean + 3*std)]
+                outliers = column[(column < mean - 3*std) | (column > mean + 3*std)]
                 
                 if len(outliers) > 0:
-                    outlier_pct = len(outliers) / len(series) * 100
+                    outlier_pct = len(outliers) / len(column) * 100
                     max_outlier = outliers.max()
                     
                     if outlier_pct > 0.5:  # More than 0.5% outliers
@@ -322,13 +380,12 @@ Focus on actionable recommendations based on the data patterns."""
                 {"role": "user", "content": prompt}
             ])
             
-            # Parse AI response
-            import json
-            # Extract JSON from response
+            # Extract JSON from response; plain find/rfind handles code
+            # fences and any surrounding prose without a regex pass
             start = response.find("[")
             end = response.rfind("]") + 1
             if start != -1 and end > start:
-                ai_insights = json.loads(response[start:end])
+                ai_insights = orjson.loads(response[start:end])
                 
                 # Format insights
                 formatted = []
@@ -374,5 +431,4 @@ Focus on actionable recommendations based on the data patterns."""
     
     def _format_name(self, name: str) -> str:
         """Format column name for display"""
-        formatted = name.replace("_", " ").replace("-", " ")
-        return " ".join(word.capitalize() for word in formatted.split())
\ No newline at end of file
+        return format_column_name(name)
\ No newline at end of file